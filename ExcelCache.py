@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+'''Columnar cache for Excel workbooks we read over and over.
+
+Parsing xlsx with openpyxl is the slowest I/O in a match or scoring run, and
+the same workbooks (MasterDDv2.xlsx, the combined models) are read every run.
+read_excel parses a workbook once and saves the DataFrame as a Feather file
+keyed by the workbook's path, modified time and size. Later reads load the
+Feather copy memory-mapped, until the workbook changes.
+
+Frames Feather cannot hold (for example a column mixing numbers and text)
+are cached as a pickle instead. Without pyarrow everything is pickled.
+
+  Typical usage example:
+
+  vocab_df = read_excel('MasterDDv2.xlsx')
+
+  Pre-warm the cache for a directory of workbooks from the command line:
+
+  python ExcelCache.py warm C:/Users/klove/Downloads
+
+Created on Sat Oct 17 13:48:20 2026
+'''
+
+import argparse
+import glob
+import hashlib
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from Instrumentation import NULL_RECORDER
+
+try:
+    import pyarrow
+    from pyarrow import feather
+except ImportError:
+    feather = None
+
+
+# read when a cache is used, not at import, so it can be changed (tests
+# point it at a temporary directory); set to None to turn the cache off
+CACHE_DIR = os.environ.get('EXCEL_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'DataScience'))
+# seconds after which a temporary cache file is taken as left by a crash
+STALE_TEMP_AGE = 3600
+
+
+def cache_key(file_name, read_args):
+    '''Returns (workbook key, version key) for a workbook and read_excel args
+
+    The workbook key only depends on the path, so older versions of the same
+    workbook can be found and removed. The version key changes when the
+    workbook is modified or read with other arguments.
+
+    '''
+    path = os.path.abspath(file_name)
+    stat = os.stat(path)
+    version = '%d|%d|%r' % (stat.st_mtime_ns, stat.st_size, sorted(read_args.items()))
+    return (hashlib.sha1(path.encode('utf-8')).hexdigest()[:16],
+            hashlib.sha1(version.encode('utf-8')).hexdigest()[:16])
+
+def load_cached(cached_name):
+    '''Loads a cached DataFrame written by save_cached'''
+    if cached_name.endswith('.pkl'):
+        return pd.read_pickle(cached_name)
+    df = feather.read_table(cached_name, memory_map=True).to_pandas()
+    # arrow gives None for missing text, read_excel gives NaN
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+def temp_name(cache_stem):
+    '''Returns a new temporary file name next to cache_stem, unique to this
+    writer so processes caching the same workbook do not share it'''
+    handle, name = tempfile.mkstemp(dir=os.path.dirname(cache_stem), suffix='.tmp',
+                                    prefix=os.path.basename(cache_stem) + '.')
+    os.close(handle)
+    return name
+
+def save_cached(df, cache_stem):
+    '''Saves df as cache_stem.feather, or cache_stem.pkl if Feather can't
+    hold it. Writes to a temporary file first so readers never see half a
+    file. Returns the cached file name.'''
+    if feather is not None:
+        cached_name = cache_stem + '.feather'
+        tmp_name = temp_name(cache_stem)
+        try:
+            feather.write_feather(df, tmp_name)
+            os.replace(tmp_name, cached_name)
+            return cached_name
+        except (pyarrow.ArrowException, ValueError, TypeError):
+            os.remove(tmp_name)
+    cached_name = cache_stem + '.pkl'
+    tmp_name = temp_name(cache_stem)
+    try:
+        df.to_pickle(tmp_name)
+    except BaseException:
+        os.remove(tmp_name)
+        raise
+    os.replace(tmp_name, cached_name)
+    return cached_name
+
+def read_excel(file_name, cache_dir = None, recorder = NULL_RECORDER, **read_args):
+    '''Reads an Excel file like pd.read_excel, using the cache when it can
+
+    Args:
+        file_name: the Excel file to read
+        cache_dir: directory for the cached copies (default CACHE_DIR);
+            False, or CACHE_DIR None, reads the Excel without the cache
+        recorder: Instrumentation.Recorder counting 'excel cache hits' and
+            'excel cache misses'
+        read_args: passed on to pd.read_excel (part of the cache key)
+
+    Returns:
+        DataFrame with the same contents pd.read_excel returns
+
+    '''
+    if cache_dir is None:
+        cache_dir = CACHE_DIR
+    if cache_dir is None or cache_dir is False:
+        return pd.read_excel(file_name, **read_args)
+    workbook_key, version_key = cache_key(file_name, read_args)
+    cache_stem = os.path.join(cache_dir, workbook_key + '-' + version_key)
+    for cached_name in [cache_stem + '.feather', cache_stem + '.pkl']:
+        if os.path.exists(cached_name):
+            recorder.count('excel cache hits')
+            return load_cached(cached_name)
+    recorder.count('excel cache misses')
+    df = pd.read_excel(file_name, **read_args)
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_name = save_cached(df, cache_stem)
+    # drop copies of older versions of this workbook, and temporary files
+    # left by a crashed writer: STALE_TEMP_AGE older than the new copy, as
+    # a newer one may still be written by another process
+    stale_time = os.path.getmtime(cached_name) - STALE_TEMP_AGE
+    for old_name in glob.glob(os.path.join(cache_dir, workbook_key + '-*')):
+        try:
+            if old_name.endswith('.tmp'):
+                if os.path.getmtime(old_name) < stale_time:
+                    os.remove(old_name)
+            elif old_name != cached_name:
+                os.remove(old_name)
+        except FileNotFoundError:
+            # another process removed it first
+            pass
+    return df
+
+def warm_cache(directory, pattern = '*.xlsx', cache_dir = None):
+    '''Reads every workbook in directory matching pattern into the cache
+
+    Excel lock files (~$name.xlsx) are skipped. cache_dir defaults to
+    CACHE_DIR, see read_excel.
+
+    Returns:
+        list of the workbook file names that were cached
+
+    '''
+    warmed = []
+    for file_name in sorted(glob.glob(os.path.join(directory, pattern))):
+        if os.path.basename(file_name).startswith('~$'):
+            continue
+        read_excel(file_name, cache_dir)
+        warmed.append(file_name)
+    return warmed
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description='Columnar cache for Excel workbooks')
+    commands = parser.add_subparsers(dest='command', required=True)
+    warm = commands.add_parser('warm', help='cache every workbook in a directory')
+    warm.add_argument('directory')
+    warm.add_argument('--pattern', default='*.xlsx')
+    warm.add_argument('--cache-dir', help='default %s' % CACHE_DIR)
+    args = parser.parse_args(args)
+    for file_name in warm_cache(args.directory, args.pattern, args.cache_dir):
+        print('cached', file_name)
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,12 @@ Created on Thu Feb 25 10:17:32 2021
 @author: klove
 """
 
+import hashlib
+import io
+import os
+import string
+import numpy as np
+import openpyxl
 import pandas as pd
 import re
 
@@ -81,33 +87,403 @@ def recode_old_new(attributes, old_val, new_val):
     std_attr = list(map(replace_in_middle, std_attr, list_old_val, list_new_val))  
     return std_attr
 
+# characters that make a NonStandard value a regular expression rather than text
+REGEX_SPECIAL_CHARS = set('.^$*+?{}[]\\|()')
+
+def recode_one(target, old_val, new_val):
+    """ Recode a single attribute the way recode_old_new does """
+    replaced = replace_at_end(target, old_val, new_val)
+    replaced = replace_at_beginning(replaced, old_val, new_val)
+    return replace_in_middle(replaced, old_val, new_val)
+
+def is_plain_rule(old_val, new_val):
+    """ True if a translation can be done on words instead of with re.sub 
+    
+    The NonStandard value must be plain printable ascii text without regex 
+    special characters or spaces at either end, and the Standard value must 
+    be ascii without backslashes (re.sub would treat those as escapes)
+    """
+    return (isinstance(old_val, str) and isinstance(new_val, str)
+            and old_val != '' and old_val.strip(' ') == old_val
+            and old_val.isascii() and old_val.isprintable() and new_val.isascii()
+            and not REGEX_SPECIAL_CHARS.intersection(old_val) and '\\' not in new_val)
+
+def words_overlap(first, second):
+    """ True if one word tuple contains the other or they share words at an edge
+    
+    words_overlap(('cas', 'number'), ('number', 'type')) == True
+    """
+    if len(first) < len(second):
+        first, second = second, first
+    size = len(second)
+    for start in range(len(first) - size + 1):
+        if first[start:start + size] == second:
+            return True
+    for size in range(1, len(second)):
+        if first[-size:] == second[:size] or second[-size:] == first[:size]:
+            return True
+    return False
+
+class WordStage:
+    """ Several translations done together in one pass over each attribute
+    
+    Replaces the same words re.sub would in recode_old_new: the whole 
+    attribute, the words at the end, the words at the beginning, and words
+    in the middle surrounded by spaces. Like re.sub, two matches in the 
+    middle for the same translation cannot share the space between them.
+    
+    Only holds translations that cannot change each other's matches (see 
+    compile_translations), so doing them together gives the same result 
+    as doing them one after the other. Attributes that are not plain ascii
+    text fall back to recode_one so case folding is exactly re's.
+    """
+    def __init__(self):
+        self.rules = []
+        self.first_words = {}
+
+    def interacts(self, old_words):
+        """ True if a translation of old_words depends on this stage's output """
+        for rule_old, rule_new, rule_words, rule_new_words in self.rules:
+            if (words_overlap(rule_words, old_words) 
+                or words_overlap(tuple(rule_new.lower().split(' ')), old_words)):
+                return True
+        return False
+
+    def add(self, old_val, new_val, old_words):
+        rule = (old_val, new_val, old_words, new_val.split(' '))
+        self.first_words.setdefault(old_words[0], []).append((len(self.rules), rule))
+        self.rules.append(rule)
+
+    def apply(self, target):
+        if not isinstance(target, str) or '\n' in target or not target.isascii():
+            for old_val, new_val, old_words, new_words in self.rules:
+                target = recode_one(target, old_val, new_val)
+            return target
+        words = target.split(' ')
+        lowered = target.lower().split(' ')
+        count = len(words)
+        recoded = []
+        middle_end = {}
+        i = 0
+        while i < count:
+            for rule_id, (old_val, new_val, old_words, new_words) in self.first_words.get(lowered[i], ()):
+                end = i + len(old_words)
+                if end > count or tuple(lowered[i:end]) != old_words:
+                    continue
+                if 0 < i and end < count:
+                    # in the middle: the space before was used by the last match
+                    if middle_end.get(rule_id) == i:
+                        continue
+                    middle_end[rule_id] = end
+                recoded.extend(new_words)
+                i = end
+                break
+            else:
+                recoded.append(words[i])
+                i += 1
+        return ' '.join(recoded)
+
+class RegexStage:
+    """ A single translation done with re.sub, as recode_old_new does """
+    def __init__(self, old_val, new_val):
+        self.old_val = old_val
+        self.new_val = new_val
+
+    def apply(self, target):
+        return recode_one(target, self.old_val, self.new_val)
+
+def compile_translations(translations):
+    """ Compiles (NonStandard, Standard) pairs into a list of stages
+    
+        Consecutive plain text translations go into one WordStage as long as
+        none of them can match words an earlier one in the stage matches or 
+        produces; otherwise a new stage starts. Translations that overlap 
+        themselves, or that are regular expressions, get their own 
+        RegexStage. Applying the stages in order gives the same result as 
+        applying the translations one by one with recode_old_new.
+    
+    Args: 
+        translations - list of (old value, new value) tuples, in order
+    
+    Returns:
+        stages - list of WordStage and RegexStage objects
+    """
+    stages = []
+    stage = None
+    for old_val, new_val in translations:
+        old_words = None
+        if is_plain_rule(old_val, new_val):
+            old_words = tuple(old_val.lower().split(' '))
+            new_words = tuple(new_val.lower().split(' '))
+            overlaps_itself = any(old_words[-size:] == old_words[:size] 
+                                  for size in range(1, len(old_words)))
+            if overlaps_itself or (new_words != old_words 
+                                   and words_overlap(new_words, old_words)):
+                old_words = None
+        if old_words is None:
+            stages.append(RegexStage(old_val, new_val))
+            stage = None
+            continue
+        if stage is None or stage.interacts(old_words):
+            stage = WordStage()
+            stages.append(stage)
+        stage.add(old_val, new_val, old_words)
+    return stages
+
+def translate(attributes, stages):
+    """ Applies compiled translation stages to a list of attributes
+    
+    Returns:
+        a new list with the translations done in it
+    """
+    recoded_attrs = []
+    for target in attributes:
+        for stage in stages:
+            target = stage.apply(target)
+        recoded_attrs.append(target)
+    return recoded_attrs
+
+class Translator:
+    """ Translations from a translator file, loaded once and kept compiled
+    
+    Use one Translator for many calls and files instead of re-reading the 
+    Excel every time. Before each use the file's modified time and size are
+    checked; if either changed, the file is hashed and, if the contents 
+    changed too, the translations are reloaded and recompiled.
+    
+    translator = Translator('DD Transforms.xlsx')
+    attributes = translator.translate(attributes)
+    
+    Args:
+        translator_fname - the file to load the translations from
+            translator file must have "NonStandard" and "Standard Logical" cols
+    """
+    def __init__(self, translator_fname = TRANSLATOR_FILE_NAME):
+        self.translator_fname = translator_fname
+        self.file_stat = None
+        self.file_hash = None
+        self.stages = []
+        self.refresh()
+
+    def refresh(self):
+        """ Reloads the translations if the file changed; True if reloaded """
+        stat = os.stat(self.translator_fname)
+        file_stat = (stat.st_mtime_ns, stat.st_size)
+        if file_stat == self.file_stat:
+            return False
+        with open(self.translator_fname, 'rb') as translator_file:
+            contents = translator_file.read()
+        self.file_stat = file_stat
+        file_hash = hashlib.sha1(contents).hexdigest()
+        if file_hash == self.file_hash:
+            return False
+        transforms = pd.read_excel(io.BytesIO(contents))
+        self.stages = compile_translations(zip(transforms["NonStandard"], 
+                                               transforms["Standard Logical"]))
+        self.file_hash = file_hash
+        return True
+
+    def translate(self, attributes):
+        """ Replaces nonStandard with Standard values, see find_and_replace """
+        self.refresh()
+        if len(self.stages) == 0:
+            return attributes
+        return translate(attributes, self.stages)
+
+# Translators already loaded, by absolute file name
+translators = {}
+
+def get_translator(translator_fname = TRANSLATOR_FILE_NAME):
+    """ Returns the shared Translator for a file, loading it the first time """
+    key = os.path.abspath(translator_fname)
+    if key not in translators:
+        translators[key] = Translator(translator_fname)
+    return translators[key]
+
 def find_and_replace(attributes, translator_fname = TRANSLATOR_FILE_NAME):
     """ Replaces nonStandard with Standard values in a list of attributes
     
         Looks for a pattern at the beginning or end of a word, or in the
         middle if surrounded by spaces, and replaces it with a new value
+        
+        The translations are compiled (see compile_translations) so each 
+        attribute is rewritten in one pass instead of three re.sub calls 
+        per translation; the result is the same as applying them in order.
     
     Args: 
         attributes - a list of attributes to do the find and replace in 
         translator_fname - the file to load the translations from
             translator file must have "NonStandard" and "Standard Logical" cols
+            or a Translator; a file name uses the shared Translator for 
+            that file so it is only read again when it changes
     
     Returns:
         recoded_attrs - a new list with the replacements done in it
     """
-       # load the translator file
-    transforms = pd.read_excel(translator_fname )
-    transforms['translate tuple'] = list(zip(transforms["NonStandard"], transforms["Standard Logical"]))
-    recoded_attrs = attributes
-    for transformer in transforms['translate tuple']:
-        recoded_attrs = recode_old_new(recoded_attrs,transformer[0], transformer[1])
-    return recoded_attrs
+    if isinstance(translator_fname, Translator):
+        translator = translator_fname
+    else:
+        translator = get_translator(translator_fname)
+    return translator.translate(attributes)
+
+# Rules for Normalizer: each takes one name and returns the new name
+def underscore_to_space(name):
+    return str.replace(name, '_', ' ')
+
+def doublespace_to_space(name):
+    return str.replace(name, '  ', ' ')
+
+def collapse_whitespace(name):
+    """Replaces every run of whitespace with a single space"""
+    return ' '.join(str.split(name))
+
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+def strip_punctuation(name):
+    """Removes ascii punctuation characters"""
+    return str.translate(name, PUNCTUATION_TABLE)
+
+# the rules standardize_cosmetic applies, in order
+COSMETIC_RULES = [underscore_to_space, doublespace_to_space, str.strip, str.title]
+
+class Normalizer:
+    """ Applies a list of name rules to many names in a single pass
+    
+    Each distinct name is run through all the rules once, and the results 
+    are copied back to every position with that name, so there are no 
+    intermediate lists per rule. Missing values (NaN/None) are left as is.
+    
+    normalizer = Normalizer(COSMETIC_RULES + [strip_punctuation])
+    names = normalizer.normalize(df['Attribute Name'])
+    
+    Args:
+        rules - list of functions taking a name and returning the new name,
+            applied in order
+    """
+    def __init__(self, rules = COSMETIC_RULES):
+        self.rules = list(rules)
+
+    def add_rule(self, rule):
+        self.rules.append(rule)
+
+    def normalize_name(self, name):
+        for rule in self.rules:
+            name = rule(name)
+        return name
+
+    def normalize(self, names):
+        """ Returns the normalized names in the same type as names
+        
+        Args:
+            names - pandas Series, numpy array or list of names
+        
+        Returns:
+            Series with the same index, numpy array or list
+        """
+        values = np.asarray(names, dtype=object)
+        codes, uniques = pd.factorize(values)
+        normalized = np.array([self.normalize_name(name) for name in uniques], 
+                              dtype=object)
+        result = np.empty(len(values), dtype=object)
+        result[:] = normalized.take(codes) if len(normalized) else values
+        missing = codes < 0
+        result[missing] = values[missing]
+        if isinstance(names, pd.Series):
+            return pd.Series(result, index=names.index, name=names.name)
+        if isinstance(names, np.ndarray):
+            return np.array(result.tolist()) if names.dtype.kind == 'U' else result
+        return result.tolist()
+
+# shared normalizer for standardize_cosmetic
+cosmetic_normalizer = Normalizer()
 
 def standardize_cosmetic(attributes):
-    # Standardize the attribute names
-    std_attr = attributes.copy()
-    std_attr = remove_underscores(std_attr)
-    std_attr = remove_doublespace(std_attr)
-    std_attr = remove_lead_trail(std_attr)
-    std_attr = standardize_case(std_attr)
-    return std_attr
+    """Returns list of names with underscores and double spaces replaced, 
+    lead/trail spaces stripped, and title cased (see COSMETIC_RULES)
+    
+    """
+    return list(cosmetic_normalizer.normalize(attributes))
+
+# rows per chunk for read_file_chunks
+CHUNK_SIZE = 50000
+
+def read_excel_chunks(file_name, chunk_size = CHUNK_SIZE):
+    """Yields the first sheet of an xlsx as DataFrames of chunk_size rows
+    
+    Uses openpyxl in read-only mode so only one chunk of rows is held in 
+    memory. The first row is the header, named like pd.read_excel names it:
+    blank header cells are 'Unnamed: <position>' and repeated names get
+    '.1', '.2'... Blank rows between data rows are kept as rows of NaN and
+    trailing blank rows are dropped, also like pd.read_excel, so the rows
+    and their labels are the same as reading the whole sheet.
+    
+    """
+    workbook = openpyxl.load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = dedupe_columns(header)
+        blank_row = (None,) * len(columns)
+        start = 0
+        chunk = []
+        blank_rows = 0
+        for row in rows:
+            if all(value is None for value in row):
+                # only kept if a data row follows
+                blank_rows += 1
+                continue
+            chunk.extend([blank_row] * blank_rows)
+            blank_rows = 0
+            chunk.append(tuple(row[:len(columns)]) + blank_row[len(row):])
+            while len(chunk) >= chunk_size:
+                yield chunk_to_df(chunk[:chunk_size], columns, start)
+                start += chunk_size
+                chunk = chunk[chunk_size:]
+        if chunk:
+            yield chunk_to_df(chunk, columns, start)
+    finally:
+        workbook.close()
+
+def dedupe_columns(header):
+    """Returns the column names for a header row the way pd.read_excel 
+    names them: blank cells are 'Unnamed: <position>' and repeated names 
+    get '.1', '.2'... (named columns are renamed before unnamed ones)"""
+    columns = ['Unnamed: %d' % position if name is None else name
+               for position, name in enumerate(header)]
+    unnamed = [position for position, name in enumerate(header) if name is None]
+    counts = {}
+    for position in [position for position, name in enumerate(header)
+                     if name is not None] + unnamed:
+        name = old_name = columns[position]
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[old_name] = count + 1
+            name = '%s.%d' % (old_name, count)
+            count = count + 1 if name in columns else counts.get(name, 0)
+        columns[position] = name
+        counts[name] = count + 1
+    return columns
+
+def chunk_to_df(chunk, columns, start):
+    """Returns rows as a DataFrame indexed from start, None read as NaN"""
+    df = pd.DataFrame(chunk, columns=columns,
+                      index=pd.RangeIndex(start, start + len(chunk)))
+    return df.fillna(np.nan)
+
+def read_file_chunks(file_name, chunk_size = CHUNK_SIZE):
+    """Yields a CSV or Excel file as DataFrames of at most chunk_size rows
+    
+    Row labels continue across chunks, so they are the same as reading the
+    whole file at once.
+    
+    Args:
+        file_name: a .csv file, or an .xlsx/.xlsm file (first sheet)
+        chunk_size: the most rows per DataFrame
+    
+    """
+    if file_name.lower().endswith('.csv'):
+        yield from pd.read_csv(file_name, chunksize=chunk_size)
+    else:
+        yield from read_excel_chunks(file_name, chunk_size)
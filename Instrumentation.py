@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+'''Per-stage timing and counters for match and scoring runs.
+
+Pass a Recorder as recorder= to run_vocab_match, VocabMatcher, preprocess_df,
+match_vocab or score_data_dictionary to find out where a slow run spent its
+time. Stages record wall and CPU time and nest: a 'translate' stage inside
+'preprocess' is reported as 'preprocess.translate'. Counters record rows in
+and out, distinct terms, candidates scored and cache hits.
+
+Functions default to NULL_RECORDER, whose stages and counters do nothing,
+so a run without instrumentation pays one method call per stage.
+
+  Typical usage example:
+
+  recorder = Recorder()
+  results = VocabChecker.run_vocab_match('ColumnsToMatch.xlsx', 70, 40,
+                                         recorder=recorder)
+  print(recorder.report())
+  recorder.log()     # one JSON line on the Instrumentation logger
+
+Created on Sat Oct 17 17:02:35 2026
+'''
+
+import contextlib
+import json
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class Recorder:
+    '''Collects stage timings and counters for one or more runs
+
+    Attributes:
+        stages: dict of stage name to {'wall': seconds, 'cpu': seconds,
+            'calls': count}, in the order the stages first started
+        counters: dict of counter name to total
+
+    '''
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.open_stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        '''Times the with block as stage name (inside the open stage)'''
+        name = '.'.join(self.open_stages + [name])
+        stats = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+        self.open_stages.append(name.rsplit('.', 1)[-1])
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            stats['wall'] += time.perf_counter() - wall
+            stats['cpu'] += time.process_time() - cpu
+            stats['calls'] += 1
+            self.open_stages.pop()
+
+    def count(self, name, amount = 1):
+        '''Adds amount to counter name'''
+        self.counters[name] = self.counters.get(name, 0) + int(amount)
+
+    def report(self):
+        '''Returns {'stages': ..., 'counters': ...} as plain dicts'''
+        return {'stages': {name: dict(stats) for name, stats in self.stages.items()},
+                'counters': dict(self.counters)}
+
+    def to_json(self):
+        return json.dumps(self.report())
+
+    def log(self, log = logger, level = logging.INFO):
+        '''Writes the report as one JSON line'''
+        log.log(level, self.to_json())
+
+
+class NullRecorder:
+    '''A Recorder that records nothing'''
+
+    null_stage = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self.null_stage
+
+    def count(self, name, amount = 1):
+        pass
+
+    def report(self):
+        return {'stages': {}, 'counters': {}}
+
+
+NULL_RECORDER = NullRecorder()
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+'''Streaming writers for match and scoring results.
+
+DataFrame.to_excel builds the whole workbook in memory before saving it.
+The writers here take the results a batch of rows at a time and stream them
+to the file, so memory stays flat however many rows are written:
+
+    .xlsx     xlsxwriter in constant_memory mode (openpyxl write-only
+              mode if xlsxwriter is not installed); a sheet that reaches
+              Excel's row limit continues on a new sheet
+    .csv      appended batch by batch
+    .parquet  pyarrow ParquetWriter, one row group per batch
+
+List cells are flattened the same way for every backend (see flatten_value):
+a 'Matches' list of (match, score) tuples becomes
+'Customer Identifier (95); Customer Name (90)', and other lists and tuples
+(like the entity 'Models') become 'm1; m2'. The matches can also be passed
+as a VocabScoring.MatchResult next to the rows; the 'Matches' text is then
+made from its arrays at write time (see flatten_matches), so no list of
+tuples is built for the export.
+
+  Typical usage example:
+
+  write_results(results, 'Matched_Vocab.xlsx')
+
+  with open_writer('Matched_Vocab.parquet') as writer:
+      for result_df in matcher.iter_match(to_match_df):
+          writer.write(result_df)
+
+  result_df, result = matcher.match_file_compact('ColumnsToMatch.xlsx')
+  write_results(result_df, 'Matched_Vocab.csv', matches=result,
+                loc=VocabChecker.MATCHES_LOC)
+
+Created on Sat Oct 17 18:04:27 2026
+'''
+
+import os
+import numpy as np
+import openpyxl
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+try:
+    import pyarrow
+    from pyarrow import parquet
+except ImportError:
+    parquet = None
+
+
+ROWS_PER_BATCH = 10000
+EXCEL_MAX_ROWS = 1048576
+LIST_SEPARATOR = '; '
+MATCHES_COL = 'Matches'
+SHEET_NAME = 'Sheet1'
+
+
+def flatten_value(value):
+    '''Returns value with lists and tuples flattened to text
+
+    A list of (match, score) pairs becomes 'match (score); ...', any other
+    list or tuple becomes its items joined with LIST_SEPARATOR. Other
+    values are returned as they are.
+
+    '''
+    if not isinstance(value, (list, tuple)):
+        return value
+    if isinstance(value, list) and all(isinstance(item, tuple) and len(item) == 2
+                                       for item in value):
+        return LIST_SEPARATOR.join('%s (%s)' % item for item in value)
+    return LIST_SEPARATOR.join(str(item) for item in value)
+
+def flatten_matches(result):
+    '''Returns the 'Matches' text of every row of a VocabScoring.MatchResult
+
+    The same text flatten_value makes of the row's list of (match, score)
+    tuples, made once per term used by the rows, straight from the arrays.
+
+    '''
+    terms, term_rows = np.unique(result.rows, return_inverse=True)
+    starts = result.offsets[terms].tolist()
+    ends = result.offsets[terms + 1].tolist()
+    matched = result.vocab[result.positions].tolist()
+    scores = result.scores.tolist()
+    texts = np.array([LIST_SEPARATOR.join('%s (%s)' % (matched[i], scores[i])
+                                          for i in range(start, end))
+                      for start, end in zip(starts, ends)], dtype=object)
+    return texts[term_rows.reshape(-1)]
+
+def flatten_df(df):
+    '''Returns df with the list and tuple cells of object columns flattened'''
+    flat_df = None
+    for col in df.columns[df.dtypes == object]:
+        values = df[col].to_numpy()
+        nested = np.fromiter((isinstance(value, (list, tuple)) for value in values),
+                             dtype=bool, count=len(values))
+        if nested.any():
+            if flat_df is None:
+                flat_df = df.copy()
+            flat_df[col] = [flatten_value(value) for value in values]
+    return df if flat_df is None else flat_df
+
+def batch_rows(df, index):
+    '''Yields the rows of df as lists of Python values, NaN as None'''
+    frame = df.reset_index() if index else df
+    values = frame.astype(object).where(frame.notna(), None).to_numpy()
+    for row in values:
+        yield [value.item() if isinstance(value, np.generic) else value for value in row]
+
+def header(df, index):
+    names = [str(col) for col in df.columns]
+    if index:
+        names = ['' if df.index.name is None else str(df.index.name)] + names
+    return names
+
+
+class ResultWriter:
+    '''Base class: write(df) batches, then close() (or use with)
+
+    Args:
+        file_name: the file to write
+        index: if True the DataFrame index is written as the first column,
+            like DataFrame.to_excel does by default
+
+    '''
+
+    def __init__(self, file_name, index = True):
+        self.file_name = file_name
+        self.index = index
+        self.row_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, df, matches = None, loc = None):
+        '''Writes a batch of rows, flattening list cells
+
+        Args:
+            df: the rows to write
+            matches: optional VocabScoring.MatchResult whose rows are the
+                rows of df, written as a flattened MATCHES_COL column
+            loc: the position of that column (the last one if None)
+
+        '''
+        if matches is not None:
+            df = df.copy()
+            df.insert(len(df.columns) if loc is None else loc, MATCHES_COL,
+                      flatten_matches(matches))
+        self.write_batch(flatten_df(df))
+        self.row_count += len(df)
+
+    def write_batch(self, df):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ExcelWriter(ResultWriter):
+    '''Streams rows into an xlsx, starting a new sheet at the row limit'''
+
+    def __init__(self, file_name, index = True, max_rows = EXCEL_MAX_ROWS):
+        super().__init__(file_name, index)
+        self.max_rows = max_rows
+        self.sheet = None
+        self.sheet_rows = 0
+        self.sheet_count = 0
+        self.columns = None
+        if xlsxwriter is not None:
+            self.workbook = xlsxwriter.Workbook(file_name, {'constant_memory': True})
+        else:
+            self.workbook = openpyxl.Workbook(write_only=True)
+
+    def new_sheet(self):
+        self.sheet_count += 1
+        name = SHEET_NAME if self.sheet_count == 1 else 'Sheet%d' % self.sheet_count
+        if xlsxwriter is not None:
+            self.sheet = self.workbook.add_worksheet(name)
+        else:
+            self.sheet = self.workbook.create_sheet(name)
+        self.sheet_rows = 0
+        self.append(self.columns)
+
+    def append(self, row):
+        if xlsxwriter is not None:
+            self.sheet.write_row(self.sheet_rows, 0, row)
+        else:
+            self.sheet.append(row)
+        self.sheet_rows += 1
+
+    def write_batch(self, df):
+        if self.columns is None:
+            self.columns = header(df, self.index)
+            self.new_sheet()
+        for row in batch_rows(df, self.index):
+            if self.sheet_rows == self.max_rows:
+                self.new_sheet()
+            self.append(row)
+
+    def close(self):
+        if self.sheet is None:
+            # nothing was written, still leave a valid workbook
+            self.columns = []
+            self.new_sheet()
+        if xlsxwriter is not None:
+            self.workbook.close()
+        else:
+            self.workbook.save(self.file_name)
+
+
+class CsvWriter(ResultWriter):
+    '''Appends each batch to a CSV, the header with the first one'''
+
+    def write_batch(self, df):
+        df.to_csv(self.file_name, mode='w' if self.row_count == 0 else 'a',
+                  header=self.row_count == 0, index=self.index)
+
+    def close(self):
+        if not os.path.exists(self.file_name):
+            open(self.file_name, 'w').close()
+
+
+class ParquetWriter(ResultWriter):
+    '''Writes each batch as a Parquet row group
+
+    Every batch must fit the schema of the first one. Object columns, and
+    columns the first batch has no values for (all None or all NaN), are
+    written as text, and later batches are converted to the same text
+    columns, so a column that is blank in the first batch and filled in
+    later (like definitions) still fits.
+
+    '''
+
+    def __init__(self, file_name, index = True):
+        if parquet is None:
+            raise ImportError('Parquet output needs pyarrow')
+        super().__init__(file_name, index)
+        self.writer = None
+
+    def write_batch(self, df):
+        df = df.copy()
+        if self.writer is None:
+            self.text_columns = [col for col in df.columns
+                                 if df[col].dtype == object or df[col].isna().all()]
+        for col in self.text_columns:
+            df[col] = df[col].astype(object).where(df[col].isna(), df[col].astype(str))
+        if self.writer is None:
+            table = pyarrow.Table.from_pandas(df, preserve_index=self.index)
+            text_names = set(str(col) for col in self.text_columns)
+            schema = pyarrow.schema([field.with_type(pyarrow.string())
+                                     if field.type == pyarrow.null()
+                                     or field.name in text_names else field
+                                     for field in table.schema],
+                                    metadata=table.schema.metadata)
+            self.schema = schema
+            self.writer = parquet.ParquetWriter(self.file_name, schema)
+        table = pyarrow.Table.from_pandas(df, schema=self.schema,
+                                          preserve_index=self.index)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+WRITERS = {'.xlsx': ExcelWriter, '.csv': CsvWriter, '.parquet': ParquetWriter}
+
+def open_writer(file_name, index = True):
+    '''Returns the ResultWriter for the file's extension'''
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError('no result writer for %s files, use one of %s'
+                         % (extension, ', '.join(WRITERS)))
+    return WRITERS[extension](file_name, index)
+
+def write_batches(batches, file_name, index = True):
+    '''Streams an iterable of DataFrames to file_name - returns row count'''
+    with open_writer(file_name, index) as writer:
+        for df in batches:
+            writer.write(df)
+    return writer.row_count
+
+def write_results(df, file_name, index = True, rows_per_batch = ROWS_PER_BATCH,
+                  matches = None, loc = None):
+    '''Writes a DataFrame to file_name rows_per_batch rows at a time
+
+    Args:
+        matches, loc: optional VocabScoring.MatchResult for the rows of df
+            and where to write its column, see ResultWriter.write
+
+    Returns:
+        the number of rows written
+
+    '''
+    if matches is None:
+        return write_batches((df.iloc[start:start + rows_per_batch]
+                              for start in range(0, len(df), rows_per_batch)),
+                             file_name, index)
+    with open_writer(file_name, index) as writer:
+        for start in range(0, len(df), rows_per_batch):
+            stop = start + rows_per_batch
+            writer.write(df.iloc[start:stop], matches.with_rows(matches.rows[start:stop]),
+                         loc)
+        if len(df) == 0:
+            writer.write(df, matches, loc)
+    return writer.row_count
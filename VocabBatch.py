@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+'''Match a whole directory of data dictionaries against the vocabulary.
+
+The vocabulary, definitions, translator and any index are prepared once in a
+VocabChecker.VocabMatcher, sent once to each worker process, and the files
+are matched in parallel. Each input gets its own output, and a summary with
+one row per file (rows, distinct terms, top match counts, time, status) is
+written next to them. A file that fails is reported in the summary and in
+the error report instead of stopping the batch.
+
+  Typical usage example:
+
+  summary_df = run_batch('C:/Users/klove/Downloads/Models', 'C:/Users/klove/Downloads/Matched',
+                         70, 40)
+
+  python VocabBatch.py "Models/*.xlsx" Matched --threshold 70 --max-matches 40
+
+Created on Sat Oct 17 19:02:14 2026
+'''
+
+import argparse
+import glob
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import ResultWriter
+import VocabChecker
+
+
+INPUT_PATTERNS = ['*.xlsx', '*.csv']
+OUTPUT_SUFFIX = '_Matched'
+SUMMARY_FILE_NAME = 'Batch_Summary.xlsx'
+ERROR_FILE_NAME = 'Batch_Errors.csv'
+
+logger = logging.getLogger(__name__)
+
+
+def find_inputs(inputs):
+    '''Returns the sorted input files for a directory, a glob or a list
+
+    Directories are searched for INPUT_PATTERNS; Excel lock files (~$name)
+    are skipped.
+
+    '''
+    if isinstance(inputs, str):
+        if os.path.isdir(inputs):
+            file_names = [file_name for pattern in INPUT_PATTERNS
+                          for file_name in glob.glob(os.path.join(inputs, pattern))]
+        else:
+            file_names = glob.glob(inputs)
+    else:
+        file_names = list(inputs)
+    return sorted(file_name for file_name in file_names
+                  if not os.path.basename(file_name).startswith('~$'))
+
+def output_names(input_file_names, output_dir, extension):
+    '''Returns <output_dir>/<stem>_Matched<extension> for each input
+
+    Inputs with the same stem (Model.xlsx and Model.csv, or the same name
+    in two directories) get _2, _3... so no output is overwritten.
+
+    '''
+    names = []
+    seen = {}
+    for input_file_name in input_file_names:
+        stem = os.path.splitext(os.path.basename(input_file_name))[0] + OUTPUT_SUFFIX
+        seen[stem] = seen.get(stem, 0) + 1
+        if seen[stem] > 1:
+            stem += '_%d' % seen[stem]
+        names.append(os.path.join(output_dir, stem + extension))
+    return names
+
+def match_one_file(matcher, input_file_name, output_file_name):
+    '''Matches one file and writes its output - returns its summary row
+
+    Never raises: a failure is returned as status 'error' with the error.
+
+    '''
+    start = time.perf_counter()
+    summary = {'Input File': input_file_name, 'Output File': output_file_name,
+               'Rows': 0, 'Distinct Terms': 0, 'Matched Rows': 0,
+               'Multiple Matches': 0, 'No Matches': 0, 'Seconds': 0.0,
+               'Status': 'ok', 'Error': None}
+    try:
+        result_df, result = matcher.match_file_compact(input_file_name)
+        ResultWriter.write_results(result_df, output_file_name, matches=result,
+                                   loc=VocabChecker.MATCHES_LOC)
+        top_match = result_df['Top Match Attribute']
+        summary.update({'Rows': len(result_df),
+                        'Distinct Terms': result_df[VocabChecker.ATTRIBUTE_COL].nunique(),
+                        'Matched Rows': int((~top_match.isin(['no matches',
+                                                              'multiple matches'])).sum()),
+                        'Multiple Matches': int((top_match == 'multiple matches').sum()),
+                        'No Matches': int((top_match == 'no matches').sum())})
+    except Exception as error:
+        summary.update({'Output File': None, 'Status': 'error',
+                        'Error': '%s: %s' % (type(error).__name__, error),
+                        'Traceback': traceback.format_exc()})
+    summary['Seconds'] = time.perf_counter() - start
+    return summary
+
+def _init_batch_worker(matcher):
+    '''Keeps the prepared matcher in the worker process'''
+    global _worker_matcher
+    _worker_matcher = matcher
+
+def _match_file_in_worker(input_file_name, output_file_name):
+    return match_one_file(_worker_matcher, input_file_name, output_file_name)
+
+def run_batch(inputs, output_dir, threshold, max_matches,
+              vocab_file_name = VocabChecker.MASTER_VOCAB_FILE_NAME,
+              std_abbrev_file_name = VocabChecker.TRANSLATOR_FILE_NAME,
+              workers = None, extension = '.xlsx', use_index = False,
+              batch_size = None, use_keys = False, use_blocks = False):
+    '''Matches every input file against one prepared vocabulary
+
+    Args:
+        inputs: a directory, a glob pattern or a list of file names
+        output_dir: where the outputs, summary and error report are written
+        threshold, max_matches, vocab_file_name, std_abbrev_file_name,
+            use_index, batch_size, use_keys, use_blocks: see 
+            VocabChecker.run_vocab_match
+        workers: processes to match files with (default one per core);
+            1 matches the files one after another in this process
+        extension: the output format, '.xlsx', '.csv' or '.parquet'
+
+    Returns:
+        summary_df: one row per input file, also written to
+            SUMMARY_FILE_NAME; failed files are also listed with their
+            traceback in ERROR_FILE_NAME
+
+    '''
+    input_file_names = find_inputs(inputs)
+    os.makedirs(output_dir, exist_ok=True)
+    matcher = VocabChecker.VocabMatcher(vocab_file_name, std_abbrev_file_name, threshold,
+                                        max_matches, use_index, batch_size,
+                                        use_keys=use_keys, use_blocks=use_blocks)
+    output_file_names = output_names(input_file_names, output_dir, extension)
+    if workers == 1 or len(input_file_names) <= 1:
+        summaries = [match_one_file(matcher, input_file_name, output_file_name)
+                     for input_file_name, output_file_name
+                     in zip(input_file_names, output_file_names)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(matcher,)) as pool:
+            summaries = list(pool.map(_match_file_in_worker, input_file_names,
+                                      output_file_names))
+    for summary in summaries:
+        logger.info('%s: %s, %d rows in %.1fs', summary['Input File'], summary['Status'],
+                    summary['Rows'], summary['Seconds'])
+
+    summary_df = pd.DataFrame(summaries, columns=['Input File', 'Output File', 'Rows',
+                                                  'Distinct Terms', 'Matched Rows',
+                                                  'Multiple Matches', 'No Matches',
+                                                  'Seconds', 'Status', 'Error'])
+    ResultWriter.write_results(summary_df, os.path.join(output_dir, SUMMARY_FILE_NAME),
+                               index=False)
+    errors_df = pd.DataFrame([summary for summary in summaries
+                              if summary['Status'] == 'error'],
+                             columns=['Input File', 'Error', 'Traceback'])
+    error_file_name = os.path.join(output_dir, ERROR_FILE_NAME)
+    if len(errors_df):
+        ResultWriter.write_results(errors_df, error_file_name, index=False)
+    elif os.path.exists(error_file_name):
+        os.remove(error_file_name)
+    return summary_df
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description='Match a directory of data dictionaries')
+    parser.add_argument('inputs', help='a directory or a glob pattern')
+    parser.add_argument('output_dir')
+    parser.add_argument('--threshold', type=int, default=70)
+    parser.add_argument('--max-matches', type=int, default=40)
+    parser.add_argument('--vocab', default=VocabChecker.MASTER_VOCAB_FILE_NAME)
+    parser.add_argument('--translator', default=VocabChecker.TRANSLATOR_FILE_NAME)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--format', default='.xlsx', choices=['.xlsx', '.csv', '.parquet'])
+    parser.add_argument('--index', choices=['ngram', 'length'])
+    parser.add_argument('--keys', action='store_true',
+                        help='resolve exact and normalized-key hits before fuzzy matching')
+    parser.add_argument('--blocks', action='store_true',
+                        help="match each row against its entity's vocab attributes first")
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+    summary_df = run_batch(args.inputs, args.output_dir, args.threshold, args.max_matches,
+                           args.vocab, args.translator, args.workers, args.format,
+                           args.index, use_keys=args.keys, use_blocks=args.blocks)
+    print(summary_df[['Input File', 'Rows', 'Status', 'Error']].to_string(index=False))
+    return int((summary_df['Status'] == 'error').any())
+
+if __name__ == '__main__':
+    raise SystemExit(main())
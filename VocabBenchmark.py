@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+'''Synthetic benchmarks for the matching and scoring pipeline.
+
+Generates a vocabulary, a translator table and a data dictionary of any size
+(the data dictionary attribute names are noisy copies of vocab names:
+abbreviated, lower case, underscores) and times each hot path on its own:
+
+    standardize_cosmetic, find_and_replace, match_vocab, score_definitions,
+    attribute_count_in_df, get_models
+
+Each stage is timed best of repeat runs. match_vocab scores every distinct
+term against the whole vocab, so it runs on the first min(rows, match_rows)
+rows of the data dictionary; the other stages run on all rows. The match
+rows of each size are reported with the results, and match_vocab is only
+compared with a baseline that matched as many rows.
+
+Results are JSON, so they can be kept as a baseline and compared with a
+later run; a stage slower than tolerance times its baseline is reported as
+a regression.
+
+  Typical usage example:
+
+  python VocabBenchmark.py --sizes 1000 10000 100000 --save-baseline
+  python VocabBenchmark.py --sizes 1000 10000 100000   (compares to baseline)
+
+Created on Sat Oct 17 16:05:52 2026
+'''
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import FilePrepUtils
+import VocabChecker
+import standardizeEntityNames
+
+
+SIZES = [1000, 10000, 100000, 1000000]
+VOCAB_SIZE = 1000
+# the most rows match_vocab is timed on
+MATCH_ROWS = 5000
+REPEAT = 3
+# a stage is a regression when slower than TOLERANCE x baseline and by
+# more than MIN_DELTA seconds (so timer noise on tiny stages is ignored)
+TOLERANCE = 1.25
+MIN_DELTA = 0.005
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'benchmarks', 'baseline.json')
+
+STAGES = ['standardize_cosmetic', 'find_and_replace', 'match_vocab',
+          'score_definitions', 'attribute_count_in_df', 'get_models']
+
+WORDS = ['Customer', 'Order', 'Product', 'Account', 'Agreement', 'Packet',
+         'Unit', 'Measure', 'Supplier', 'Invoice', 'Shipment', 'Contract',
+         'Material', 'Plant', 'Region', 'Country', 'Currency', 'Employee',
+         'Identifier', 'Number', 'Name', 'Date', 'Description', 'Quantity',
+         'Amount', 'Code', 'Type', 'Status', 'Price', 'Weight', 'Address',
+         'Reference', 'Category', 'Effective', 'Expiration', 'Primary']
+ABBREVIATIONS = {'Customer': 'cust', 'Order': 'ord', 'Product': 'prod',
+                 'Account': 'acct', 'Agreement': 'agrmt', 'Identifier': 'id',
+                 'Number': 'nbr', 'Description': 'desc', 'Quantity': 'qty',
+                 'Amount': 'amt', 'Date': 'dt', 'Price': 'prc',
+                 'Reference': 'ref', 'Category': 'cat', 'Address': 'addr',
+                 'Effective': 'eff', 'Expiration': 'exp', 'Primary': 'prim'}
+ENTITY_COL = VocabChecker.ENTITY_COL
+ATTRIBUTE_COL = VocabChecker.ATTRIBUTE_COL
+ATT_DEFN_COL = VocabChecker.ATT_DEFN_COL
+MODEL_COL = VocabChecker.MODEL_COL
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# Synthetic data
+# =============================================================================
+def make_names(count, rng, min_words = 2, max_words = 4):
+    '''Returns count distinct names of min_words to max_words words'''
+    names = {}
+    while len(names) < count:
+        word_counts = rng.randint(min_words, max_words + 1, size=count)
+        for word_count in word_counts:
+            name = ' '.join(rng.choice(WORDS, size=word_count, replace=False))
+            names[name] = None
+            if len(names) == count:
+                break
+        min_words += 1
+        max_words += 1
+    return list(names)
+
+def make_vocab(size, seed = 0):
+    '''Returns a vocabulary DataFrame with size distinct attribute names
+
+    Columns 'Entity Name', 'Attribute Name', 'Attribute/Column Definition'
+    like MasterDDv2.xlsx.
+
+    '''
+    rng = np.random.RandomState(seed)
+    attributes = make_names(size, rng)
+    entities = make_names(max(size // 20, 1), rng, 1, 2)
+    return pd.DataFrame({ENTITY_COL: rng.choice(entities, size=size),
+                         ATTRIBUTE_COL: attributes,
+                         ATT_DEFN_COL: ['The ' + name.lower() + '.' for name in attributes]})
+
+def make_translations(size = len(ABBREVIATIONS)):
+    '''Returns a translator DataFrame with size rows
+
+    The first rows undo the abbreviations used by make_data_dictionary, the
+    rest are extra rules that never match, like most of a real translator.
+
+    '''
+    rules = list(ABBREVIATIONS.items())[:size]
+    rules += [('zq%d' % i, 'Filler %d' % i) for i in range(size - len(rules))]
+    return pd.DataFrame({'NonStandard': [abbreviation for word, abbreviation in rules],
+                         'Standard Logical': [word for word, abbreviation in rules]})
+
+def add_noise(name, rng):
+    '''Returns name the way it might appear in a model: some words
+    abbreviated, lower case and underscores'''
+    words = [ABBREVIATIONS[word] if word in ABBREVIATIONS and rng.rand() < .5 else word
+             for word in name.split()]
+    name = ' '.join(words)
+    if rng.rand() < .5:
+        name = name.lower()
+    if rng.rand() < .3:
+        name = name.replace(' ', '_')
+    return name
+
+def make_data_dictionary(rows, vocab_df, seed = 0, distinct = None):
+    '''Returns a data dictionary DataFrame with rows rows
+
+    Attribute names are noisy copies of vocab names drawn from a pool of
+    distinct names (default min(rows, 20000)), so names repeat across
+    models like they do in real data dictionaries. About 10% of the
+    definitions are missing and some names get a second definition.
+
+    '''
+    rng = np.random.RandomState(seed)
+    if distinct is None:
+        distinct = min(rows, 20000)
+    vocab_names = vocab_df[ATTRIBUTE_COL].to_numpy()
+    pool = np.array([add_noise(name, rng) for name in rng.choice(vocab_names, size=distinct)])
+    pool_defns = np.array(['Definition of ' + name for name in pool], dtype=object)
+    picks = rng.randint(0, distinct, size=rows)
+    definitions = pool_defns[picks]
+    definitions[rng.rand(rows) < .1] = np.nan
+    other = rng.rand(rows) < .05
+    definitions[other] = 'Another definition'
+    models = np.array(['Model %d' % i for i in range(rows // 1000 + 1)])
+    entities = vocab_df[ENTITY_COL].unique()
+    return pd.DataFrame({MODEL_COL: models[rng.randint(0, len(models), size=rows)],
+                         ENTITY_COL: entities[rng.randint(0, len(entities), size=rows)],
+                         ATTRIBUTE_COL: pool[picks],
+                         ATT_DEFN_COL: definitions})
+
+# =============================================================================
+# Timing
+# =============================================================================
+def best_time(function, repeat = REPEAT):
+    '''Returns (best seconds of repeat calls, result of the last call)'''
+    best = None
+    for attempt in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+def benchmark(rows, vocab_size = VOCAB_SIZE, match_rows = MATCH_ROWS,
+              repeat = REPEAT, seed = 0):
+    '''Times every stage on a synthetic data dictionary of rows rows,
+    match_vocab on the first min(rows, match_rows)
+
+    Returns:
+        dict of stage name to best seconds
+
+    '''
+    vocab_df = make_vocab(vocab_size, seed)
+    dd_df = make_data_dictionary(rows, vocab_df, seed)
+    vocab = pd.unique(vocab_df[ATTRIBUTE_COL])
+    timings = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        translator_file = os.path.join(work_dir, 'Translations.xlsx')
+        make_translations().to_excel(translator_file, index=False)
+        translator = FilePrepUtils.Translator(translator_file)
+
+        timings['standardize_cosmetic'], names = best_time(
+            lambda: FilePrepUtils.standardize_cosmetic(dd_df[ATTRIBUTE_COL]), repeat)
+        timings['find_and_replace'], names = best_time(
+            lambda: FilePrepUtils.find_and_replace(names, translator), repeat)
+        to_match_df = VocabChecker.preprocess_df(dd_df.head(match_rows), ATTRIBUTE_COL,
+                                                 translator)
+        timings['match_vocab'], result_df = best_time(
+            lambda: VocabChecker.match_vocab(to_match_df, vocab, 70, 40), repeat)
+    timings['score_definitions'], scores = best_time(
+        lambda: VocabChecker.score_definitions(dd_df), repeat)
+    timings['attribute_count_in_df'], counts = best_time(
+        lambda: VocabChecker.attribute_count_in_df(dd_df), repeat)
+    timings['get_models'], models_df = best_time(
+        lambda: standardizeEntityNames.get_models(dd_df, ATTRIBUTE_COL), repeat)
+    for stage in STAGES:
+        logger.info('%d rows %s: %.4fs', rows, stage, timings[stage])
+    logger.info('%d rows: match_vocab timed on %d rows', rows, len(to_match_df))
+    return timings
+
+def run_suite(sizes = SIZES, vocab_size = VOCAB_SIZE, match_rows = MATCH_ROWS,
+              repeat = REPEAT, seed = 0):
+    '''Benchmarks every size - returns the results as a JSON-ready dict'''
+    return {'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'params': {'vocab_size': vocab_size, 'match_rows': match_rows,
+                       'repeat': repeat, 'seed': seed},
+            'match_rows': {str(rows): min(rows, match_rows) for rows in sizes},
+            'results': {str(rows): benchmark(rows, vocab_size, match_rows, repeat, seed)
+                        for rows in sizes}}
+
+def save_results(results, file_name):
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    with open(file_name, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+
+def load_results(file_name):
+    with open(file_name) as results_file:
+        return json.load(results_file)
+
+def compare(results, baseline, tolerance = TOLERANCE, min_delta = MIN_DELTA):
+    '''Finds the stages that got slower than the baseline
+
+    Only sizes and stages in both are compared, and match_vocab only when
+    both matched the same number of rows.
+
+    Returns:
+        list of (rows, stage, baseline seconds, seconds) tuples
+
+    '''
+    regressions = []
+    for rows, timings in results['results'].items():
+        baseline_timings = baseline['results'].get(rows, {})
+        same_match_rows = (results.get('match_rows', {}).get(rows) == 
+                           baseline.get('match_rows', {}).get(rows))
+        for stage, seconds in timings.items():
+            if stage not in baseline_timings:
+                continue
+            if stage == 'match_vocab' and not same_match_rows:
+                continue
+            before = baseline_timings[stage]
+            if seconds > before * tolerance and seconds - before > min_delta:
+                regressions.append((rows, stage, before, seconds))
+    return regressions
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description='Benchmark the matching and scoring pipeline')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='data dictionary rows to benchmark')
+    parser.add_argument('--vocab-size', type=int, default=VOCAB_SIZE)
+    parser.add_argument('--match-rows', type=int, default=MATCH_ROWS,
+                        help='the most rows match_vocab is timed on')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--out', help='also write the results to this JSON file')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+
+    results = run_suite(args.sizes, args.vocab_size, args.match_rows, args.repeat)
+    if args.out:
+        save_results(results, args.out)
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print('no baseline at', args.baseline, '- run with --save-baseline')
+        return 0
+    regressions = compare(results, load_results(args.baseline), args.tolerance)
+    for rows, stage, before, seconds in regressions:
+        print('REGRESSION %s rows %s: %.4fs -> %.4fs' % (rows, stage, before, seconds))
+    if not regressions:
+        print('no regressions against', args.baseline)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,10 +16,18 @@ Created on Sun Feb 14 13:15:59 2021
 @author: klove
 '''
 
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import pandas as pd
 import numpy as np
 from fuzzywuzzy import process
+import ExcelCache
 import FilePrepUtils
+import Instrumentation
+import ResultWriter
+import VocabIndex
+import VocabScoring
 
 
 WORKING_DIRECTORY = 'C:\\Users\\klove\\Downloads\\'
@@ -32,9 +40,18 @@ ENTITY_COL = 'Entity Name'
 ATTRIBUTE_COL = 'Attribute Name'
 ATT_DEFN_COL = 'Attribute/Column Definition'
 
+# terms matched between progress reports, see match_terms
+PROGRESS_STEP = 100
+# input rows per result batch, see iter_vocab_matches
+ITER_BATCH_ROWS = 500
+# position of the 'Matches' column in match_vocab results
+MATCHES_LOC = 4
 
+logger = logging.getLogger(__name__)
 
-def preprocess_df(input_df, attr_col = ATTRIBUTE_COL, translate_file_name = TRANSLATOR_FILE_NAME):
+
+def preprocess_df(input_df, attr_col = ATTRIBUTE_COL, translate_file_name = TRANSLATOR_FILE_NAME,
+                  recorder = Instrumentation.NULL_RECORDER):
     '''Drops rows with no values and standardizes the values in attr_col
     
     Standardization rules: 
@@ -47,21 +64,29 @@ def preprocess_df(input_df, attr_col = ATTRIBUTE_COL, translate_file_name = TRAN
     
     Args: 
         input_df - a dataframe with attribute column named by attr_col
+        translate_file_name - the translator file name, or a 
+            FilePrepUtils.Translator to reuse across files
+        recorder - Instrumentation.Recorder for the 'standardize cosmetic'
+            and 'translate' stages and the preprocess row counts
     
     Returns:
         input_df with original attr_col renamed prefixed with Old and 
             standardized attributes in attr_col
 
     '''
+    recorder.count('preprocess rows in', len(input_df))
     input_df = input_df.dropna(subset=[attr_col])
-    attributes = FilePrepUtils.standardize_cosmetic(input_df[attr_col])
-    attributes = FilePrepUtils.find_and_replace(attributes, translate_file_name)
+    recorder.count('preprocess rows out', len(input_df))
+    with recorder.stage('standardize cosmetic'):
+        attributes = FilePrepUtils.standardize_cosmetic(input_df[attr_col])
+    with recorder.stage('translate'):
+        attributes = FilePrepUtils.find_and_replace(attributes, translate_file_name)
     old_col = 'Old ' + attr_col
     input_df = input_df.rename(columns={attr_col: old_col})
     input_df[attr_col] = attributes
     return input_df
 
-def match_to_target(input_word, target_names, threshold, max_matches):
+def match_to_target(input_word, target_names, threshold, max_matches, index = None):
     '''Matches single word to vocabulary - returns list of tuples
 
     Uses fuzzy matching to compare a single word to a list of candidate 
@@ -73,6 +98,10 @@ def match_to_target(input_word, target_names, threshold, max_matches):
         target_names: a list with the standard vocabulary
         threshold: an integer representing the lowest score for a match
         max_matches: an integer representing the most matches to keep
+        index: optional search index built over target_names (for example
+            VocabIndex.NgramIndex or VocabIndex.LengthIndex, see build_index);
+            when given it does the matching and only scores the candidates
+            it can't rule out
 
     Returns:
         A list of tuples representing the matches and their score, sorted 
@@ -81,6 +110,8 @@ def match_to_target(input_word, target_names, threshold, max_matches):
             [ ('Aaron', 99), ('Aardvark', 75)]
 
     '''
+    if index is not None:
+        return index.extract(input_word, threshold, max_matches)
     matches = []
     score_col = 1
     for match in process.extract(input_word, target_names, limit=max_matches):
@@ -88,6 +119,25 @@ def match_to_target(input_word, target_names, threshold, max_matches):
             matches.append(match)
     return matches    
 
+def build_index(vocab, use_index):
+    '''Returns the search index use_index asks for, built over vocab
+    
+    Args:
+        vocab: the standardized vocabulary list
+        use_index: False or None for no index, True or 'ngram' for a 
+            VocabIndex.NgramIndex, 'length' for a VocabIndex.LengthIndex
+            (exact matches at any threshold)
+
+    '''
+    if use_index is None or use_index is False:
+        return None
+    if use_index is True or use_index == 'ngram':
+        return VocabIndex.NgramIndex(vocab)
+    if use_index == 'length':
+        return VocabIndex.LengthIndex(vocab)
+    raise ValueError('use_index must be False, True, "ngram" or "length", not %r'
+                     % (use_index,))
+
 def get_top_match(matches):
     '''From the list of matches, returns tuple of the highest score match.
 
@@ -114,17 +164,180 @@ def get_top_match(matches):
                 top_term = 'multiple matches'
     return (top_term, top_score)
 
-def match_vocab(to_match_df, vocab, threshold, max_matches):
+def dedupe_ratio(row_count, distinct_count):
+    '''Returns how many rows there are per distinct term (1.0 if no rows)'''
+    if distinct_count == 0:
+        return 1.0
+    return row_count / distinct_count
+
+def _init_match_worker(vocab, index, batch_size):
+    '''Keeps the vocab in the worker process so it is only sent once'''
+    global _worker_vocab, _worker_index, _worker_batch_size
+    _worker_vocab = vocab
+    _worker_index = index
+    _worker_batch_size = batch_size
+
+def _score_terms_in_worker(terms, threshold, max_matches):
+    # just the arrays go back, the parent already has the vocab
+    result = score_terms(terms, _worker_vocab, threshold, max_matches, _worker_index,
+                         _worker_batch_size)
+    return result.offsets, result.positions, result.scores
+
+def match_pool(vocab, workers, index = None, batch_size = None):
+    '''Returns a process pool for match_terms with the vocab (and index)
+    already sent to each of its workers'''
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_match_worker,
+                               initargs=(vocab, index, batch_size))
+
+def match_terms(terms, vocab, threshold, max_matches, index = None,
+                batch_size = None, workers = None, progress = None, keys = None,
+                pool = None):
+    '''Matches a list of terms to vocabulary - returns list of match lists
+
+    Args:
+        terms: the words to find matches for
+        vocab: the standardized vocabulary list
+        threshold: an integer representing the lowest score for a match
+        max_matches: an integer representing the most matches to keep
+        index: optional search index built over vocab, see match_to_target;
+            not used by the batch engine
+        batch_size: optional number of terms per score matrix chunk, see
+            VocabScoring.extract_batch
+        workers: optional number of processes to shard the terms across.
+            The vocab (and index) is sent to each worker once, and the 
+            results come back in the order of terms.
+        pool: optional match_pool(vocab, workers, index, batch_size) to 
+            shard the terms over instead of starting a pool for this call
+        progress: optional callable progress(terms_done, terms_total),
+            called after every PROGRESS_STEP terms (batch_size terms with
+            the batch engine, a chunk with workers). An exception it raises
+            stops the matching and is passed on, which is how callers 
+            cancel a run.
+        keys: optional VocabIndex.KeyIndex over vocab; terms it resolves
+            (exact and normalized-key hits, see KeyIndex.lookup) are not 
+            fuzzy matched, only the rest go to the engine chosen above
+
+    Returns:
+        A list with one entry per term, each a list of (match, score) tuples
+        like match_to_target returns.
+
+    '''
+    return score_terms(terms, vocab, threshold, max_matches, index, batch_size, workers,
+                       progress, keys, pool).to_lists()
+
+def score_terms(terms, vocab, threshold, max_matches, index = None,
+                batch_size = None, workers = None, progress = None, keys = None,
+                pool = None):
+    '''Matches a list of terms to vocabulary - returns a VocabScoring.MatchResult
+
+    Same arguments and matches as match_terms. Without an index the terms
+    are scored by VocabScoring.extract_batch_arrays (batch_size terms at a
+    time, VocabScoring.BATCH_SIZE if not set), which gives the same matches
+    as match_to_target and fills the arrays directly; only index and key 
+    hits are converted from match lists.
+
+    '''
+    terms = list(terms)
+    vocab = np.asarray(vocab)
+    if keys is not None:
+        matched = [keys.lookup(term, threshold, max_matches) for term in terms]
+        rest = [term for term, matches in zip(terms, matched) if matches is None]
+        rest_progress = None
+        if progress is not None:
+            hits = len(terms) - len(rest)
+            progress(hits, len(terms))
+            def rest_progress(rest_done, rest_total):
+                progress(hits + rest_done, len(terms))
+        hit_result = VocabScoring.MatchResult.from_match_lists(
+            [matches for matches in matched if matches is not None], vocab)
+        rest_result = score_terms(rest, vocab, threshold, max_matches, index, batch_size,
+                                  workers, rest_progress, pool=pool)
+        # the hits come first in the concatenated result, then the rest
+        is_hit = np.array([matches is not None for matches in matched], dtype=bool)
+        order = np.where(is_hit, np.cumsum(is_hit) - 1,
+                         len(hit_result) + np.cumsum(~is_hit) - 1)
+        return VocabScoring.MatchResult.concat([hit_result, rest_result]).take(order)
+    if workers is not None and workers > 1 and len(terms) > 1:
+        # a few chunks per worker so a slow chunk does not hold up the rest
+        chunk_size = -(-len(terms) // (workers * 4))
+        chunks = [terms[i:i + chunk_size] for i in range(0, len(terms), chunk_size)]
+        own_pool = pool is None
+        if own_pool:
+            pool = match_pool(vocab, workers, index, batch_size)
+        chunk_arrays = pool.map(_score_terms_in_worker, chunks, repeat(threshold),
+                                repeat(max_matches))
+        try:
+            results = []
+            terms_done = 0
+            for chunk, arrays in zip(chunks, chunk_arrays):
+                results.append(VocabScoring.MatchResult(vocab, *arrays))
+                terms_done += len(chunk)
+                if progress is not None:
+                    progress(terms_done, len(terms))
+        except BaseException:
+            # cancels the chunks not started yet, a shared pool is kept
+            chunk_arrays.close()
+            if own_pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        if own_pool:
+            pool.shutdown()
+        return VocabScoring.MatchResult.concat(results)
+    if progress is not None:
+        step = PROGRESS_STEP if batch_size is None else batch_size
+        results = []
+        for start in range(0, len(terms), step):
+            results.append(score_terms(terms[start:start + step], vocab, threshold,
+                                       max_matches, index, batch_size))
+            progress(min(start + step, len(terms)), len(terms))
+        if not results:
+            return score_terms([], vocab, threshold, max_matches)
+        return VocabScoring.MatchResult.concat(results)
+    if index is not None and batch_size is None:
+        return VocabScoring.MatchResult.from_match_lists(
+            [match_to_target(term, vocab, threshold, max_matches, index)
+             for term in terms], vocab)
+    return VocabScoring.extract_batch_arrays(terms, vocab, threshold, max_matches,
+                                             batch_size or VocabScoring.BATCH_SIZE)
+
+def match_vocab(to_match_df, vocab, threshold, max_matches, index = None,
+                batch_size = None, workers = None, progress = None,
+                recorder = Instrumentation.NULL_RECORDER, keys = None, blocks = None,
+                pool = None):
     '''Matches each term in to_match_df to standard vocab
 
-    Loops through input and runs the match, then returns a dataframe with
-    the results.
+    Each distinct term is matched once and the matches are mapped back to
+    every row with that term, then returns a dataframe with the results.
+    The dedupe ratio (rows per distinct term) is logged at INFO level.
+    Without an index the terms are scored in chunks (of batch_size if 
+    set) by VocabScoring.extract_batch_arrays, and with workers set they
+    are spread over a pool of processes (same results either way).
+
+    The 'Matches' column holds a list of (match, score) tuples per row; use
+    match_vocab_compact to keep the matches as arrays instead.
 
     Args:
         to_match_df: TODO specify what is required   
         vocab: the standardized vocabulary list
         threshold: an integer representing the lowest score for a match
         max_matches: an integer representing the most matches to keep
+        index: optional search index built over vocab, see match_to_target;
+            not used by the batch engine
+        batch_size: optional number of terms per score matrix chunk
+        workers: optional number of processes to match with, see match_terms
+        pool: optional match_pool to match with, see match_terms
+        progress: optional callable progress(rows_done, rows_total) where
+            rows_done counts the rows whose term has been matched; it can
+            raise to cancel, see match_terms
+        recorder: Instrumentation.Recorder for the 'score' and 'assemble'
+            stages and the 'match rows', 'distinct terms' and 'candidates
+            scored' counters (candidates scored by an index in worker
+            processes are not counted), and with keys the 'exact key terms',
+            'normalized key terms' and 'fuzzy terms' counters
+        keys: optional VocabIndex.KeyIndex fast path, see match_terms
+        blocks: optional VocabIndex.EntityBlocks over the vocab; each row is
+            matched against the attributes of its entity's block first, see
+            match_blocked
 
     Returns:
         output_df: a dataframe with below columns:
@@ -132,23 +345,228 @@ def match_vocab(to_match_df, vocab, threshold, max_matches):
        'Attribute Name', 'Matches', 'Top Match Attribute', 'Top Match Score1'
 
     '''
-    
-    term_matches = []
-    matched_dict = {}
-    for tbl, term in zip(to_match_df[ENTITY_COL],to_match_df[ATTRIBUTE_COL]): 
-        term_matches = match_to_target(term, vocab, threshold, max_matches);
-        matched_dict[term] = term_matches
-    # now construct a new data frame to hold the results
-    output_df = to_match_df[[ENTITY_COL,'Old '+ ATTRIBUTE_COL, ATT_DEFN_COL, 
-                             ATTRIBUTE_COL]]
-    # TODO WARNING now map the matches back to those attributes
-    output_df['Matches'] = output_df[ATTRIBUTE_COL].map(matched_dict)
-    # get top matches and append to the output
-    output_df['Top Match Tuple']= list(map(get_top_match, output_df['Matches']))
-    output_df[['Top Match Attribute','Top Match Score1']] = pd.DataFrame(output_df['Top Match Tuple'].tolist(), index=output_df.index)
-    output_df =output_df.drop(['Top Match Tuple'], axis=1)
+    output_df, result = match_vocab_compact(to_match_df, vocab, threshold, max_matches,
+                                            index, batch_size, workers, progress,
+                                            recorder, keys, blocks, pool)
+    with recorder.stage('expand'):
+        output_df.insert(MATCHES_LOC, 'Matches', result.row_lists())
     return output_df
 
+def match_vocab_compact(to_match_df, vocab, threshold, max_matches, index = None,
+                        batch_size = None, workers = None, progress = None,
+                        recorder = Instrumentation.NULL_RECORDER, keys = None,
+                        blocks = None, pool = None):
+    '''Matches each term in to_match_df to standard vocab, keeping the
+    matches as a VocabScoring.MatchResult
+
+    Same arguments and matching as match_vocab. The top match columns are
+    computed from the arrays, and no tuple is made per match; call
+    result.row_lists() for the 'Matches' column when exporting.
+
+    Returns:
+        (output_df, result): output_df has the match_vocab columns except 
+            'Matches'; result has the matches of each distinct term and 
+            result.rows maps the rows of output_df to them
+
+    '''
+    if blocks is not None:
+        with recorder.stage('score'):
+            result = match_blocked(to_match_df, vocab, threshold, max_matches, blocks,
+                                   index, batch_size, workers, progress, recorder, keys,
+                                   pool)
+        return assemble_output(to_match_df, result, recorder), result
+    terms = pd.unique(to_match_df[ATTRIBUTE_COL])
+    logger.info('matching %d distinct terms for %d rows (dedupe ratio %.1f)',
+                len(terms), len(to_match_df), dedupe_ratio(len(to_match_df), len(terms)))
+    term_progress = None
+    if progress is not None:
+        # rows covered by the first n distinct terms
+        rows_done = np.cumsum(to_match_df[ATTRIBUTE_COL].value_counts(sort=False)
+                              .reindex(terms).to_numpy())
+        rows_total = len(to_match_df)
+        progress(0, rows_total)
+        def term_progress(terms_done, terms_total):
+            progress(int(rows_done[terms_done - 1]) if terms_done else 0, rows_total)
+    recorder.count('match rows', len(to_match_df))
+    recorder.count('distinct terms', len(terms))
+    scored = getattr(index, 'scored', 0)
+    key_counts = dict(keys.counts) if keys is not None else None
+    with recorder.stage('score'):
+        result = score_terms(terms, vocab, threshold, max_matches, index, batch_size,
+                             workers, term_progress, keys, pool)
+    fuzzy_terms = len(terms)
+    if keys is not None:
+        exact, normalized, fuzzy_terms = (keys.counts[path] - key_counts[path]
+                                          for path in ['exact', 'normalized', 'fuzzy'])
+        logger.info('%d exact key terms, %d normalized key terms, %d fuzzy terms',
+                    exact, normalized, fuzzy_terms)
+        recorder.count('exact key terms', exact)
+        recorder.count('normalized key terms', normalized)
+        recorder.count('fuzzy terms', fuzzy_terms)
+    if index is None or batch_size is not None:
+        recorder.count('candidates scored', fuzzy_terms * len(vocab))
+    elif workers is None or workers <= 1:
+        recorder.count('candidates scored', getattr(index, 'scored', 0) - scored)
+    result = result.with_rows(pd.Index(terms).get_indexer(to_match_df[ATTRIBUTE_COL]))
+    return assemble_output(to_match_df, result, recorder), result
+
+def assemble_output(to_match_df, result, recorder = Instrumentation.NULL_RECORDER):
+    '''Returns the match_vocab columns but 'Matches' for a MatchResult 
+    whose rows are the rows of to_match_df'''
+    with recorder.stage('assemble'):
+        output_df = to_match_df[[ENTITY_COL,'Old '+ ATTRIBUTE_COL, ATT_DEFN_COL, 
+                                 ATTRIBUTE_COL]].copy()
+        top_terms, top_scores = result.top_match()
+        output_df['Top Match Attribute'] = top_terms
+        output_df['Top Match Score1'] = top_scores
+    return output_df
+
+def match_blocked(to_match_df, vocab, threshold, max_matches, blocks, index = None,
+                  batch_size = None, workers = None, progress = None,
+                  recorder = Instrumentation.NULL_RECORDER, keys = None, pool = None):
+    '''Matches each row to the vocab block of its entity, falling back to
+    the whole vocab - returns a VocabScoring.MatchResult
+
+    Each distinct (entity block, term) pair is matched once against the
+    attributes of the block. Pairs with no match above threshold, and rows
+    whose entity has no block, are matched against the whole vocab like
+    match_vocab does (with index, workers and keys); each distinct term
+    is matched there only once.
+
+    Args:
+        to_match_df, vocab, threshold, max_matches, index, batch_size, 
+            workers, keys, pool: see match_vocab
+        blocks: the VocabIndex.EntityBlocks over vocab
+        progress: optional callable progress(rows_done, rows_total), called
+            after each block and after the fallback
+        recorder: Instrumentation.Recorder for the 'match rows', 'distinct 
+            terms', 'blocked terms', 'fallback terms' and 'candidates 
+            scored' counters
+
+    Returns:
+        result: the matches of each distinct (block, term) pair, result.rows
+            maps the rows of to_match_df to them
+
+    '''
+    entities = pd.unique(to_match_df[ENTITY_COL])
+    entity_blocks = dict(zip(entities, (blocks.block_id(entity) for entity in entities)))
+    pairs = pd.MultiIndex.from_arrays([to_match_df[ENTITY_COL].map(entity_blocks).to_numpy(),
+                                       to_match_df[ATTRIBUTE_COL].to_numpy()])
+    units = pairs.unique()
+    rows = units.get_indexer(pairs)
+    unit_blocks = units.get_level_values(0).to_numpy()
+    unit_terms = units.get_level_values(1).to_numpy()
+    unit_rows = np.bincount(rows, minlength=len(units))
+    recorder.count('match rows', len(to_match_df))
+    recorder.count('distinct terms', len(units))
+    rows_total = len(to_match_df)
+    rows_done = 0
+    if progress is not None:
+        progress(0, rows_total)
+
+    vocab = np.asarray(vocab)
+    vocab_positions = pd.Index(vocab)
+    # each unit's matches are term unit_terms_in[unit] of results[unit_results[unit]]
+    results = []
+    unit_results = np.full(len(units), -1, dtype=np.int64)
+    unit_terms_in = np.zeros(len(units), dtype=np.int64)
+    scored = 0
+    for block_id in pd.unique(unit_blocks):
+        if block_id == -1:
+            continue
+        positions = np.flatnonzero(unit_blocks == block_id)
+        block = blocks.blocks[block_id]
+        block_result = score_terms(unit_terms[positions], block, threshold, max_matches,
+                                   batch_size=batch_size)
+        # from positions in the block to positions in the vocab
+        results.append(VocabScoring.MatchResult(
+            vocab, block_result.offsets,
+            vocab_positions.get_indexer(block)[block_result.positions],
+            block_result.scores))
+        scored += len(positions) * len(block)
+        has_match = np.diff(block_result.offsets) > 0
+        unit_results[positions[has_match]] = len(results) - 1
+        unit_terms_in[positions[has_match]] = np.flatnonzero(has_match)
+        rows_done += unit_rows[positions[has_match]].sum()
+        if progress is not None:
+            progress(int(rows_done), rows_total)
+
+    fallback = np.flatnonzero(unit_results == -1)
+    fallback_terms = pd.unique(unit_terms[fallback])
+    recorder.count('blocked terms', len(units) - len(fallback))
+    recorder.count('fallback terms', len(fallback))
+    logger.info('%d (entity, term) pairs matched in their entity block, %d distinct terms '
+                'fall back to the whole vocab', len(units) - len(fallback),
+                len(fallback_terms))
+    index_scored = getattr(index, 'scored', 0)
+    results.append(score_terms(fallback_terms, vocab, threshold, max_matches, index,
+                               batch_size, workers, keys=keys, pool=pool))
+    unit_results[fallback] = len(results) - 1
+    unit_terms_in[fallback] = pd.Index(fallback_terms).get_indexer(unit_terms[fallback])
+    if index is None or batch_size is not None:
+        scored += len(fallback_terms) * len(vocab)
+    else:
+        scored += getattr(index, 'scored', 0) - index_scored
+    recorder.count('candidates scored', scored)
+    if progress is not None:
+        progress(rows_total, rows_total)
+    firsts = np.cumsum([0] + [len(result) for result in results])
+    return VocabScoring.MatchResult.concat(results).take(
+        firsts[unit_results] + unit_terms_in).with_rows(rows)
+
+def iter_vocab_matches(to_match_df, vocab, threshold, max_matches, index = None,
+                       batch_size = None, rows_per_batch = ITER_BATCH_ROWS, keys = None,
+                       blocks = None):
+    '''Matches to_match_df to standard vocab, yielding results as they are ready
+
+    Like match_vocab, but the rows are matched rows_per_batch at a time and
+    each batch of results is yielded as soon as it is scored, so callers 
+    can show or save partial results and keep them if the run is stopped.
+    Terms are only matched the first time they are seen; later batches 
+    reuse those matches, which are kept as VocabScoring.MatchResult arrays.
+    Concatenating the batches gives the same DataFrame as match_vocab.
+
+    Args:
+        to_match_df, vocab, threshold, max_matches, index, batch_size, keys,
+            blocks: see match_vocab; with blocks each batch is matched on 
+            its own by match_vocab
+        rows_per_batch: the number of input rows in each yielded batch
+
+    Yields:
+        output_df for the next rows_per_batch rows, in input order, with
+        the match_vocab columns
+
+    '''
+    # the matches of the new terms of each batch, and where each term is
+    results = []
+    seen = {}
+    for start in range(0, len(to_match_df), rows_per_batch):
+        batch_df = to_match_df.iloc[start:start + rows_per_batch]
+        if blocks is not None:
+            yield match_vocab(batch_df, vocab, threshold, max_matches, index, batch_size,
+                              keys=keys, blocks=blocks)
+            continue
+        terms = pd.unique(batch_df[ATTRIBUTE_COL])
+        new_terms = [term for term in terms if term not in seen]
+        if new_terms:
+            seen.update((term, (len(results), position))
+                        for position, term in enumerate(new_terms))
+            results.append(score_terms(new_terms, vocab, threshold, max_matches, index,
+                                       batch_size, keys=keys))
+        by_result = {}
+        for term in terms:
+            result_number, position = seen[term]
+            by_result.setdefault(result_number, []).append((term, position))
+        parts = list(by_result.items())
+        order = [term for result_number, part in parts for term, position in part]
+        result = VocabScoring.MatchResult.concat(
+            [results[result_number].take([position for term, position in part])
+             for result_number, part in parts],
+            pd.Index(order).get_indexer(batch_df[ATTRIBUTE_COL]))
+        output_df = assemble_output(batch_df, result)
+        output_df.insert(MATCHES_LOC, 'Matches', result.row_lists())
+        yield output_df
+
 def is_dd_format(input_df):
     '''Checks to see if input file has expected data dictionary format
     
@@ -182,102 +600,427 @@ def score_definitions(input_df, colname = ATTRIBUTE_COL, defname = ATT_DEFN_COL)
         Returns:  
             attribute_scores: pandas Series same size/order as df with score
     '''
-    odf = pd.DataFrame( { colname : input_df[colname],
-                          defname : input_df[defname]})
-    odf['Definition Score'] = -1
-    unique = input_df[colname].unique()
-    # now you have to match the counts back to the df
-    score = []
-    for name_col in unique:
-        # find all the rows where this attribute appears
-        these = input_df.loc[lambda input_df: input_df[colname] == 
-                             name_col]
-        # if the definitions match, there will be 1 unique value
-        if these[defname].nunique() == 1:
-            score.append(2)
-        else:
-            score.append(1)
-    # now you have to match the scores back to the df
-    i = 0
-    for name_col in unique:
-        odf['Definition Score'].where(~((odf[colname] == name_col
-                                         )), 
-                                      other=score[i], inplace=True)
-        i+=1  
-    #  score for rows with missing attribute definition to 0
-    odf['Definition Score'] = np.where(odf[defname].isna(), 0, odf['Definition Score'])
-    odf['Definition Score'] = np.where((odf[defname] == ""), 0, odf['Definition Score'])
-    return odf['Definition Score']
+    scores = score_definition_pairs(input_df, [(colname, defname)])
+    return scores.iloc[:, 0].rename('Definition Score')
+
+def score_definition_pairs(input_df, pairs):
+    '''Scores definitions for several (name column, definition column) pairs
+    
+        Same scores as score_definitions, computed with one groupby per pair
+        instead of a filter per unique name:
+            0 if the definition is missing
+            1 if there's another row with same name different definition
+            2 if all instances of the name have same definition
+        Rows with a missing name get -1 unless the definition is missing.
+
+        Args:
+            input_df: DataFrame to check
+            pairs: list of (name column, definition column) tuples, e.g.
+                [(ATTRIBUTE_COL, ATT_DEFN_COL), 
+                 (ENTITY_COL, 'Entity/Table Definition')]
+        
+        Returns:  
+            scores_df: DataFrame same size/order as input_df with a
+                '<name column> Definition Score' column per pair
+    '''
+    scores_df = pd.DataFrame(index=input_df.index)
+    for colname, defname in pairs:
+        definitions = input_df[defname]
+        # number of distinct (non missing) definitions for the row's name
+        distinct = definitions.groupby(input_df[colname]).transform('nunique')
+        score = np.where(distinct == 1, 2, 1)
+        score = np.where(distinct.isna(), -1, score)
+        score = np.where(definitions.isna(), 0, score)
+        score = np.where((definitions == ""), 0, score)
+        scores_df[colname + ' Definition Score'] = score
+    return scores_df
  
     
     
-def attribute_count_in_df(input_df, colname = 'Attribute Name'):
+def attribute_count_in_df(input_df, colname = 'Attribute Name', distinct_col = None):
     '''Counts how many times an attribute appears in the DataFrame
        
+        The counts are mapped back to the rows with a groupby transform, so
+        this stays linear in the number of rows. Rows with a missing key 
+        get a count of 0.
     
     Args:
             input_df: DataFrame with column colname
-            colname:  column name to count
+            colname:  column name to count, or a list of column names to 
+                count combinations of, e.g. ['Entity Name', 'Attribute Name']
+            distinct_col: optional column name; if given, count the distinct
+                values of this column per key instead of the rows, e.g. 
+                'Model Name' for the number of models an attribute is in
         
     Returns:
             instance_counts: pandas Series same size/order as df with count of 
-                how many times attribute is in the df
+                how many times attribute is in the df, named 'Instance Count'
+                (or 'Distinct <distinct_col> Count')
+    '''
+    keys = [colname] if isinstance(colname, str) else list(colname)
+    grouped = input_df.groupby(keys, sort=False)
+    if distinct_col is None:
+        counts = grouped[keys[0]].transform('size')
+        name = 'Instance Count'
+    else:
+        counts = grouped[distinct_col].transform('nunique')
+        name = 'Distinct ' + distinct_col + ' Count'
+    return counts.fillna(0).astype(np.int64).rename(name)
+
+def models_by_name(input_df, colname = ATTRIBUTE_COL, model_col = MODEL_COL):
+    '''For each name, gets the sorted tuple of models it is in
+    
+        One drop_duplicates and one groupby aggregation over the 
+        (name, model) pairs, instead of filtering the frame per name.
+
+        Args:
+            input_df: DataFrame with columns colname and model_col
+            colname: the name column to group by, e.g. 'Entity Name'
+            model_col: the model column
+        
+        Returns:  
+            models: pandas Series indexed by name, in order of first 
+                appearance, with a sorted tuple of models per name
+                Example:
+                    Customer    ('Billing', 'Sales')
     '''
-    odf = pd.DataFrame( { colname : input_df[colname]})
-    odf['Instance Count'] = 0
-    values = np.array(input_df[colname])
-    (unique, counts) = np.unique(values, return_counts=True)
-    # now you have to match the counts back to the df
-    i = 0
-    for name_col in unique:
-        odf['Instance Count'].where(~(odf[colname] == name_col), other=counts[i], inplace=True)
-        i+=1
-    return odf['Instance Count']
+    pairs = input_df[[colname, model_col]].dropna(subset=[colname]).drop_duplicates()
+    names = pd.unique(pairs[colname])
+    pairs = pairs.sort_values(model_col, kind='stable')
+    models = pairs.groupby(colname, sort=False)[model_col].agg(tuple)
+    return models.reindex(names)
 
 # =============================================================================
-#  public facing functions below here. maybe I'll create a class sometime
+#  public facing functions and the VocabMatcher class below here
 # 
 # =============================================================================
 
+RESULT_COLUMNS = [ENTITY_COL, 'Old ' + ATTRIBUTE_COL, ATT_DEFN_COL, ATTRIBUTE_COL,
+                  'Matches', 'Top Match Attribute', 'Matched Attribute Definition',
+                  'Top Match Score']
+
+def read_match_file(match_file_name, recorder = Instrumentation.NULL_RECORDER):
+    '''Reads a CSV, or an Excel through ExcelCache'''
+    if match_file_name.lower().endswith('.csv'):
+        return pd.read_csv(match_file_name)
+    return ExcelCache.read_excel(match_file_name, recorder=recorder)
+
+def add_definitions(result_df, translator_dict):
+    '''Adds the vocab definitions to match_vocab results and renames the score'''
+    result_df['Matched Attribute Definition'] = result_df[ATTRIBUTE_COL].map(translator_dict)
+    result_df['Top Match Score'] = result_df['Top Match Score1']
+    result_df = result_df.drop(['Top Match Score1'], axis=1)
+    return result_df
+
+class VocabMatcher:
+    '''Matches terms to a vocabulary loaded and prepared once.
+
+    Reading the vocab, finding its distinct terms, building the definitions
+    map, loading the translator and building a search index is most of the
+    time of a small match. A VocabMatcher does that setup once, so callers
+    that match many inputs (automation, the GUI) only pay for the matching.
+
+    The translator is the shared FilePrepUtils Translator, so edits to the
+    translator file are picked up on the next match. The vocab is not 
+    reloaded; make a new VocabMatcher when the vocab file changes.
+
+    With workers, the process pool is started on the first match and kept
+    for the next ones; close the matcher (or use it in a with block) to
+    shut it down.
+
+      Typical usage example:
+
+      with VocabMatcher(MASTER_VOCAB_FILE_NAME, threshold=70, max_matches=40) as matcher:
+          results = matcher.match_file('ColumnsToMatch.xlsx')
+
+    Attributes:
+        vocab: numpy array of the distinct vocab attribute names
+        definitions: dict of vocab attribute name to its definition
+        translator: the FilePrepUtils.Translator used by preprocess_df
+        index: the VocabIndex.NgramIndex over vocab, or None
+        keys: the VocabIndex.KeyIndex fast path over vocab, or None
+        blocks: the VocabIndex.EntityBlocks over the vocab, or None
+        threshold, max_matches, batch_size, workers: see run_vocab_match
+        recorder: the Instrumentation.Recorder for the setup and every
+            match (Instrumentation.NULL_RECORDER records nothing)
+        pool: the match_pool shared by the matches, None until the first
+            match with workers and after close
+
+    '''
+
+    def __init__(self, vocab_file_name = MASTER_VOCAB_FILE_NAME,
+                 std_abbrev_file_name = TRANSLATOR_FILE_NAME, threshold = 70,
+                 max_matches = 40, use_index = False, batch_size = None,
+                 workers = None, recorder = Instrumentation.NULL_RECORDER,
+                 use_keys = False, use_blocks = False):
+        self.recorder = recorder
+        with recorder.stage('load vocab'):
+            input_vocab_df = ExcelCache.read_excel(vocab_file_name, recorder=recorder)
+            self.vocab = pd.unique(input_vocab_df[ATTRIBUTE_COL])
+            self.definitions = dict(zip(input_vocab_df[ATTRIBUTE_COL], 
+                                        input_vocab_df[ATT_DEFN_COL]))
+            self.blocks = None
+            if use_blocks:
+                self.blocks = VocabIndex.EntityBlocks(input_vocab_df[ENTITY_COL],
+                                                      input_vocab_df[ATTRIBUTE_COL])
+        recorder.count('vocab terms', len(self.vocab))
+        with recorder.stage('load translator'):
+            if isinstance(std_abbrev_file_name, FilePrepUtils.Translator):
+                self.translator = std_abbrev_file_name
+            else:
+                self.translator = FilePrepUtils.get_translator(std_abbrev_file_name)
+        with recorder.stage('build index'):
+            self.index = build_index(self.vocab, use_index)
+            self.keys = VocabIndex.KeyIndex(self.vocab) if use_keys else None
+        self.threshold = threshold
+        self.max_matches = max_matches
+        self.batch_size = batch_size
+        self.workers = workers
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        # a process pool can't be pickled, a copy starts its own
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
+
+    def close(self):
+        '''Shuts down the worker pool, if one was started'''
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def worker_pool(self):
+        '''Returns the shared match_pool (started on first use), or None
+        without workers'''
+        if self.workers is None or self.workers <= 1:
+            return None
+        if self.pool is None:
+            self.pool = match_pool(self.vocab, self.workers, self.index, self.batch_size)
+        return self.pool
+
+    def standardize(self, terms):
+        '''Returns terms standardized the way preprocess_df does it'''
+        terms = FilePrepUtils.standardize_cosmetic(terms)
+        return FilePrepUtils.find_and_replace(terms, self.translator)
+
+    def match_terms(self, terms, standardize = True):
+        '''Matches a list of terms - returns a list of match lists
+
+        Args:
+            terms: the words to find matches for
+            standardize: if True the terms are standardized first, like the
+                attribute names in match and match_file
+        
+        Returns:
+            A list with one entry per term, each a list of (match, score) 
+            tuples like match_to_target returns.
+
+        '''
+        if standardize:
+            terms = self.standardize(terms)
+        return match_terms(terms, self.vocab, self.threshold, self.max_matches,
+                           self.index, self.batch_size, self.workers, keys=self.keys,
+                           pool=self.worker_pool())
+
+    def match(self, to_match_df, progress = None):
+        '''Preprocesses and matches a DataFrame - returns the results
+
+        Args:
+            to_match_df: DataFrame with columns 'Entity Name', 
+                'Attribute Name' and 'Attribute/Column Definition'
+            progress: optional callable progress(rows_done, rows_total), 
+                see match_vocab
+
+        Returns:
+            result_df: DataFrame with the columns in RESULT_COLUMNS
+        
+        '''
+        return self.match_rows(to_match_df, progress, True)[0]
+
+    def match_compact(self, to_match_df, progress = None):
+        '''Preprocesses and matches a DataFrame, keeping the matches as 
+        arrays - see match_vocab_compact
+
+        Returns:
+            (result_df, result): result_df has the columns in RESULT_COLUMNS
+                but 'Matches'; result is the VocabScoring.MatchResult for 
+                its rows, for ResultWriter to write as the 'Matches' column
+
+        '''
+        return self.match_rows(to_match_df, progress, False)
+
+    def match_rows(self, to_match_df, progress, expand):
+        '''Does match (expand True) or match_compact (expand False)'''
+        recorder = self.recorder
+        with recorder.stage('preprocess'):
+            to_match_df = preprocess_df(to_match_df, ATTRIBUTE_COL, self.translator,
+                                        recorder)
+        with recorder.stage('match'):
+            result_df, result = match_vocab_compact(to_match_df, self.vocab, 
+                                                    self.threshold, self.max_matches, 
+                                                    self.index, self.batch_size,
+                                                    self.workers, progress, recorder,
+                                                    self.keys, self.blocks, 
+                                                    self.worker_pool())
+            if expand:
+                with recorder.stage('expand'):
+                    result_df.insert(MATCHES_LOC, 'Matches', result.row_lists())
+        with recorder.stage('add definitions'):
+            result_df = add_definitions(result_df, self.definitions)
+        recorder.count('result rows', len(result_df))
+        return result_df, result
+
+    def iter_match(self, to_match_df, rows_per_batch = ITER_BATCH_ROWS):
+        '''Preprocesses to_match_df and yields results batch by batch
+        
+        See iter_vocab_matches; each batch also has the definitions, like
+        the results of match.
+        
+        '''
+        to_match_df = to_match_df.dropna(subset=[ATTRIBUTE_COL])
+        to_match_df = preprocess_df(to_match_df, ATTRIBUTE_COL, self.translator)
+        for result_df in iter_vocab_matches(to_match_df, self.vocab, self.threshold,
+                                            self.max_matches, self.index, 
+                                            self.batch_size, rows_per_batch, self.keys,
+                                            self.blocks):
+            yield add_definitions(result_df, self.definitions)
+
+    def match_file(self, match_file_name, progress = None):
+        '''Matches a CSV or Excel file - returns the results, see match'''
+        with self.recorder.stage('read input'):
+            to_match_df = read_match_file(match_file_name, self.recorder)
+        return self.match(to_match_df, progress)
+
+    def match_file_compact(self, match_file_name, progress = None):
+        '''Matches a CSV or Excel file - returns (result_df, result), see
+        match_compact'''
+        with self.recorder.stage('read input'):
+            to_match_df = read_match_file(match_file_name, self.recorder)
+        return self.match_compact(to_match_df, progress)
+
+    def match_file_streaming(self, match_file_name, output_file_name,
+                             chunk_size = FilePrepUtils.CHUNK_SIZE):
+        '''Matches a large file chunk by chunk into an output file
+
+        The input is read chunk_size rows at a time with 
+        FilePrepUtils.read_file_chunks, and each chunk is matched and 
+        streamed to output_file_name before the next is read, so peak 
+        memory depends on chunk_size, not on the file size. The output can
+        be .xlsx, .csv or .parquet, see ResultWriter.open_writer. The 
+        matches stay VocabScoring.MatchResult arrays until the writer 
+        flattens them.
+
+        Returns:
+            the number of result rows written
+
+        '''
+        with ResultWriter.open_writer(output_file_name) as writer:
+            for chunk_df in FilePrepUtils.read_file_chunks(match_file_name, chunk_size):
+                chunk_df = chunk_df.dropna(subset=[ATTRIBUTE_COL])
+                if len(chunk_df) == 0:
+                    continue
+                writer.write(*self.match_compact(chunk_df), MATCHES_LOC)
+                logger.info('streamed %d result rows to %s', writer.row_count, 
+                            output_file_name)
+            if writer.row_count == 0:
+                # still write the header so the output has the usual columns
+                writer.write(pd.DataFrame(columns=RESULT_COLUMNS))
+        return writer.row_count
+
 def run_vocab_match(match_file_name, threshold, max_matches, 
                     vocab_file_name = MASTER_VOCAB_FILE_NAME,
-                    std_abbrev_file_name = TRANSLATOR_FILE_NAME):
+                    std_abbrev_file_name = TRANSLATOR_FILE_NAME,
+                    use_index = False, batch_size = None, workers = None,
+                    progress = None, recorder = Instrumentation.NULL_RECORDER,
+                    use_keys = False, use_blocks = False):
     '''Matches terms in an input file to a vocabulary and returns dataframe.
 
-    Retrieves rows pertaining to the given keys from the Table instance
-    represented by table_handle.  String keys will be UTF-8 encoded.
+    Builds a VocabMatcher for this one file; to match several files keep a
+    VocabMatcher instead so the vocab is only prepared once.
 
     Args:
-        input_file_name: Excel with columns 'Entity Name' and 'Attribute Name'
+        match_file_name: Excel (or CSV) with columns 'Entity Name' and 
+               'Attribute Name'
         threshold: an integer representing the lowest score for a match
         max_matches: an integer representing the most matches to keep
-        vocab: Excel with target terms with columns 'Attribute Name' 
+        vocab_file_name: Excel with target terms with columns 'Attribute Name' 
                and 'Entity Name'
+        std_abbrev_file_name: translator file name or FilePrepUtils.Translator
+        use_index: if True (or 'ngram'), build a VocabIndex.NgramIndex over 
+               the vocab so each term is only scored against candidates 
+               sharing n-grams; 'length' builds a VocabIndex.LengthIndex 
+               that skips vocab terms whose length rules them out
+        batch_size: if set, score the terms in chunks of this many with the
+               VocabScoring batch engine (see match_vocab)
+        workers: if set, match with this many processes (see match_terms)
+        progress: optional callable progress(rows_done, rows_total); it is
+               called as terms are matched and can raise to cancel the run
+               (see match_vocab)
+        recorder: an Instrumentation.Recorder to time the stages (load 
+               vocab, read input, preprocess, match, ...) and count rows, 
+               distinct terms, candidates scored and cache hits
+        use_keys: if True, terms that equal a vocab term, or match one up to
+               case, separators and word order, are resolved by a 
+               VocabIndex.KeyIndex lookup among the vocab terms with the 
+               same key and only the rest are fuzzy matched (hits do not 
+               list near matches with another key)
+        use_blocks: if True, each row is matched against the vocab 
+               attributes of its entity (the vocab 'Entity Name' with the 
+               same key or the best fuzzy match, see VocabIndex.EntityBlocks)
+               and only falls back to the whole vocab when nothing there 
+               scores above threshold
+
+    The vocab and input workbooks are read through ExcelCache, so repeat 
+    runs load a columnar copy instead of parsing the Excel again.
 
     Returns:
-        result_df: a dataframe with below columns:
-            'Orig Entity Name', 'Orig Attribute Name','Best Match Term',
-            'Best Match Score', 'Top Matches'
+        result_df: a dataframe with the columns in RESULT_COLUMNS
 
     '''
-    input_vocab_df = pd.read_excel(vocab_file_name)
-    vocab = pd.unique(input_vocab_df[ATTRIBUTE_COL])
+    with VocabMatcher(vocab_file_name, std_abbrev_file_name, threshold, max_matches,
+                      use_index, batch_size, workers, recorder, use_keys,
+                      use_blocks) as matcher:
+        return matcher.match_file(match_file_name, progress)
 
-    # load the file to match
-    to_match_df = pd.read_excel(match_file_name)
-    to_match_df = to_match_df.dropna(subset=[ATTRIBUTE_COL])
-    to_match_df = preprocess_df(to_match_df, ATTRIBUTE_COL, std_abbrev_file_name)
+def run_vocab_match_streaming(match_file_name, output_file_name, threshold, 
+                              max_matches, vocab_file_name = MASTER_VOCAB_FILE_NAME,
+                              std_abbrev_file_name = TRANSLATOR_FILE_NAME,
+                              chunk_size = FilePrepUtils.CHUNK_SIZE, use_index = False,
+                              batch_size = None, workers = None,
+                              recorder = Instrumentation.NULL_RECORDER, use_keys = False,
+                              use_blocks = False):
+    '''Matches a large input file to a vocabulary chunk by chunk
     
-    result_df = match_vocab(to_match_df, vocab, threshold, max_matches)
-    #result_df.to_excel(WORKING_DIRECTORY + 'New_' + match_file_name)
+    Same results as run_vocab_match, but the input (CSV or xlsx) is read
+    and matched chunk_size rows at a time and streamed to the output, see
+    VocabMatcher.match_file_streaming.
 
-    translator_dict = dict(zip(input_vocab_df[ATTRIBUTE_COL], input_vocab_df[ATT_DEFN_COL]))
-    result_df['Matched Attribute Definition'] = result_df[ATTRIBUTE_COL].map(translator_dict)
-    result_df['Top Match Score'] = result_df['Top Match Score1']
-    result_df = result_df.drop(['Top Match Score1'], axis=1)
-    return result_df
+    Args:
+        match_file_name: CSV or Excel with columns 'Entity Name' and 
+               'Attribute Name'
+        output_file_name: the .xlsx, .csv or .parquet file to write the 
+               results to ('Matches' flattened, see ResultWriter)
+        chunk_size: the number of input rows read and matched at a time
+        other args: see run_vocab_match
+
+    Returns:
+        the number of result rows written
+
+    '''
+    with VocabMatcher(vocab_file_name, std_abbrev_file_name, threshold, max_matches,
+                      use_index, batch_size, workers, recorder, use_keys,
+                      use_blocks) as matcher:
+        return matcher.match_file_streaming(match_file_name, output_file_name,
+                                            chunk_size)
 
-def score_data_dictionary(input_file_name):
+def score_data_dictionary(input_file_name, recorder = Instrumentation.NULL_RECORDER):
     '''Scores data dictionary for inconsistencies and missing values.
     
         Examine the input data dictionary and score each attribute:
@@ -292,6 +1035,8 @@ def score_data_dictionary(input_file_name):
         Args:
             input_file_name: Excel with columns 'Model Name','Entity Name', 
                 'Attribute Name', 'Attribute/Column Definition'
+            recorder: an Instrumentation.Recorder to time the stages and
+                count rows and cache hits
                 
         Returns:
             result_df: a dataframe echoing the input columns plus:
@@ -300,13 +1045,18 @@ def score_data_dictionary(input_file_name):
     '''
     output_df = pd.DataFrame()
     # potential file does not exist
-    input_df = pd.read_excel(input_file_name)
+    with recorder.stage('read input'):
+        input_df = ExcelCache.read_excel(input_file_name, recorder=recorder)
+    recorder.count('rows in', len(input_df))
     if(is_dd_format(input_df)):
         output_df = input_df.copy()
-        output_df['Definition Score'] = score_definitions(input_df)
+        with recorder.stage('score definitions'):
+            output_df['Definition Score'] = score_definitions(input_df)
         # find the attributes where every definition matches and score 2
         # find attributes where some definitions do not match and score 1
-        output_df['Instance Count'] = attribute_count_in_df(input_df)
+        with recorder.stage('count instances'):
+            output_df['Instance Count'] = attribute_count_in_df(input_df)
+        recorder.count('rows out', len(output_df))
     else:
         output_df = 'Input File must have all required columns and at least 1 row'
         # TODO consider raising exception
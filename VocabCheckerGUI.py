@@ -12,19 +12,39 @@ vocabulary is obfuscated in the controller class VocabChecker.
   output file
       Excel file in the same directory as the input file
 
+The match runs on a worker thread so the window stays responsive; a progress
+bar shows rows matched, rate and ETA, and Cancel stops the run.
+
 Created on Sun Feb 14 13:15:59 2021
 
 @author: klove
 """
 
 import os
+import queue
+import threading
+import time
 import tkinter as tk
+from tkinter import ttk
 from tkinter.filedialog import askopenfilename
 from tkinter.constants import LEFT, RIGHT
+import ResultWriter
 import VocabChecker
 
 WORKING_DIRECTORY = "./"
 RESULT_FILE_NAME = 'Matched_Vocab.xlsx'
+# milliseconds between checks for news from the worker thread
+POLL_INTERVAL = 100
+
+
+class JobCancelled(Exception):
+    """Raised on the worker thread to stop a run when Cancel is clicked"""
+
+
+# the worker thread never touches Tk: it puts events on job_events and the
+# Tk thread picks them up in poll_job
+job_events = queue.Queue()
+cancel_requested = threading.Event()
  
 def get_file_name():
     """Returns the fully qualified file name that the user selects.
@@ -37,11 +57,89 @@ def get_file_name():
     return file_name
 
 def close_app():
+    cancel_requested.set()
     window.destroy()
 
+def format_progress(rows_done, rows_total, seconds):
+    """Returns e.g. '1,200 of 5,000 rows matched, 400 rows/s, ETA 9s'"""
+    text = "{:,} of {:,} rows matched".format(rows_done, rows_total)
+    if rows_done > 0 and seconds > 0:
+        rate = rows_done / seconds
+        text += ", {:,.0f} rows/s, ETA {:.0f}s".format(rate, (rows_total - rows_done) / rate)
+    return text
+
+def result_batches(results):
+    """Yields the results ResultWriter.ROWS_PER_BATCH rows at a time, 
+    stopping with JobCancelled when Cancel is clicked"""
+    for start in range(0, len(results), ResultWriter.ROWS_PER_BATCH):
+        if cancel_requested.is_set():
+            raise JobCancelled()
+        yield results.iloc[start:start + ResultWriter.ROWS_PER_BATCH]
+
+def run_job(user_file_name, user_threshold, user_max_matches):
+    """Matches the file and writes the results - runs on the worker thread
+
+    """
+    start = time.perf_counter()
+    def progress(rows_done, rows_total):
+        if cancel_requested.is_set():
+            raise JobCancelled()
+        job_events.put(('progress', rows_done, rows_total, time.perf_counter() - start))
+    result_file = None
+    try:
+        results = VocabChecker.run_vocab_match(user_file_name, user_threshold, 
+                                               user_max_matches, progress=progress)
+        if cancel_requested.is_set():
+            raise JobCancelled()
+        directory = os.path.split(user_file_name)[0]
+        result_file = directory + "/" + RESULT_FILE_NAME
+        job_events.put(('writing', result_file))
+        ResultWriter.write_batches(result_batches(results), result_file)
+        job_events.put(('done', result_file))
+    except JobCancelled:
+        # do not leave a partly written result file behind
+        if result_file is not None and os.path.exists(result_file):
+            os.remove(result_file)
+        job_events.put(('cancelled',))
+    except Exception as error:
+        job_events.put(('failed', str(error)))
+
+def poll_job():
+    """Shows the worker's progress; re-enables Run when the job is over
+
+    """
+    finished = False
+    while not job_events.empty():
+        event = job_events.get()
+        if event[0] == 'progress':
+            rows_done, rows_total, seconds = event[1:]
+            progress_bar.config(maximum=max(rows_total, 1), value=rows_done)
+            myLabel.config(text = format_progress(rows_done, rows_total, seconds))
+        elif event[0] == 'writing':
+            myLabel.config(text = "Writing results to " + event[1])
+        elif event[0] == 'done':
+            myLabel.config(text = "Results written to " + event[1])
+            finished = True
+        elif event[0] == 'cancelled':
+            progress_bar.config(value=0)
+            myLabel.config(text = "Cancelled")
+            finished = True
+        else:
+            myLabel.config(text = "Failed: " + event[1])
+            finished = True
+    if finished:
+        button_run.config(state='normal')
+        button_cancel.config(state='disabled')
+    else:
+        window.after(POLL_INTERVAL, poll_job)
+
+def cancel_job():
+    cancel_requested.set()
+    button_cancel.config(state='disabled')
+    myLabel.config(text = "Cancelling...")
 
 def run_app():
-    """Gathers the user inputs and calls VocabChecker
+    """Gathers the user inputs and starts VocabChecker on a worker thread
 
     """
     myLabel.config(text = "getting user inputs")
@@ -68,18 +166,19 @@ def run_app():
         return
     
     myLabel.config(text = "file: " + user_file_name)
-    results = VocabChecker.run_vocab_match(user_file_name, user_threshold, user_max_matches)
-    #print(results.head())
-    directory = os.path.split(user_file_name)[0]
-    #print(directory)
-    result_file = directory + "/" + RESULT_FILE_NAME
-    myLabel.config(text = "Writing results to " + result_file)
-    results.to_excel(result_file)
+    progress_bar.config(value=0)
+    button_run.config(state='disabled')
+    button_cancel.config(state='normal')
+    cancel_requested.clear()
+    worker = threading.Thread(target=run_job, daemon=True,
+                              args=(user_file_name, user_threshold, user_max_matches))
+    worker.start()
+    window.after(POLL_INTERVAL, poll_job)
 
 # main program
 window = tk.Tk() 
 window.title("Vocabulary Checker") 
-window.geometry("600x300") # size of the window when it opens
+window.geometry("600x340") # size of the window when it opens
 
 # three frames on top of each other
 frame_header = tk.Frame(window, borderwidth=2, pady=2)
@@ -125,12 +224,17 @@ max_matches_entry.pack(side=RIGHT, padx=2)
 max_matches.pack(side=RIGHT)
 
 myLabel.pack(pady=10)
+progress_bar = ttk.Progressbar(frame_main_2, orient='horizontal', mode='determinate', length=400)
+progress_bar.pack(pady=2)
 
 # a proper app needs some buttons too!
 button_run = tk.Button(bottom_frame, text="Run", command=run_app, bg='dark green', fg='white', relief='raised', width=10, font=('Helvetica 9 bold'))
-button_run.grid(column=0, row=0, sticky='w', padx=100, pady=2)
+button_run.grid(column=0, row=0, sticky='w', padx=60, pady=2)
+
+button_cancel = tk.Button(bottom_frame, text="Cancel", command=cancel_job, state='disabled', relief='raised', width=10, font=('Helvetica 9'))
+button_cancel.grid(column=1, row=0, padx=10, pady=2)
 
 button_close = tk.Button(bottom_frame, text="Exit", command=close_app, bg='dark red', fg='white', relief='raised', width=10, font=('Helvetica 9'))
-button_close.grid(column=1, row=0, sticky='e', padx=100, pady=2)
+button_close.grid(column=2, row=0, sticky='e', padx=60, pady=2)
 
 window.mainloop()
\ No newline at end of file
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+'''Search structures that narrow the standard vocabulary before fuzzy matching.
+
+Scoring every input term against every vocabulary term gets slow once the
+master vocabulary grows past a few tens of thousands of attributes. The
+indexes here are built once over the vocabulary and hand back the matches
+for a term after scoring only the vocabulary entries that can plausibly
+pass the match threshold.
+
+  Typical usage example:
+
+  index = NgramIndex(vocab)
+  matches = VocabChecker.match_to_target('Cust Id', vocab, 90, 5, index)
+
+NgramIndex prunes by shared character n-grams; LengthIndex prunes by the
+best score the length difference allows and returns exactly the matches of
+a full scan at any threshold. KeyIndex resolves the terms that equal a
+vocabulary term, or match one after key normalization, without scoring.
+EntityBlocks partitions the vocabulary by entity for blocked matching.
+
+Created on Sat Oct 17 09:12:40 2026
+'''
+
+import heapq
+import numpy as np
+from fuzzywuzzy import fuzz, process, utils
+import VocabScoring
+
+
+NGRAM_SIZE = 3
+# WRatio scores substring and very different length pairs at most 90, and a
+# match must score above the threshold, so from 90 up only terms sharing
+# n-grams with the input can match
+SAFE_THRESHOLD = 90
+# lowest fuzzy score for an input entity name to use a vocab entity's block
+ENTITY_THRESHOLD = 90
+
+
+def ngrams(text, n = NGRAM_SIZE):
+    '''Returns the set of character n-grams of each word in text.
+
+    The text is processed the same way fuzzywuzzy processes it before
+    scoring (lower case, letters and numbers only), and each word is padded
+    with a space on both sides so short words and word boundaries still
+    produce n-grams. Because n-grams never span two words, reordering the
+    words does not change the result.
+
+    Args:
+        text: the term to split into n-grams
+        n: the number of characters in each n-gram
+
+    Returns:
+        A set of strings of length n (or shorter for very short words)
+        Example:
+            ngrams('Cust Id') == {' cu', 'cus', 'ust', 'st ', ' id', 'id '}
+
+    '''
+    grams = set()
+    for word in utils.full_process(text, force_ascii=True).split():
+        padded = ' ' + word + ' '
+        grams.update(padded[i:i + n] for i in range(max(len(padded) - n + 1, 1)))
+    return grams
+
+
+class NgramIndex:
+    '''Character n-gram inverted index over the standard vocabulary.
+
+    Maps each n-gram to the positions of the vocabulary terms containing it.
+    Only vocabulary terms sharing at least min_shared n-grams with the input
+    term are scored.
+
+    Recall safety: a term sharing no n-grams with the vocabulary entry can
+    still score up to 90, because WRatio scores a substring (anywhere in a
+    word, like 'ab' in 'Xaby Code') at 0.9 times its partial ratio. So
+    pruning is only applied when the match threshold is at least
+    safe_threshold, and below that the full vocabulary is scored. With the
+    defaults (safe_threshold 90, min_shared 1) the matches are the same as
+    a full scan. Raising min_shared or lowering safe_threshold trades
+    recall for speed.
+
+    Attributes:
+        vocab: numpy array with the standard vocabulary
+        n: the number of characters in each n-gram
+        safe_threshold: the lowest threshold for which pruning is applied
+        min_shared: the fewest n-grams a candidate must share with the term
+        postings: dict of n-gram to numpy array of vocab positions
+        scored: the number of vocab terms scored by extract so far
+
+    '''
+
+    def __init__(self, vocab, n = NGRAM_SIZE, safe_threshold = SAFE_THRESHOLD,
+                 min_shared = 1):
+        self.vocab = np.asarray(vocab)
+        self.n = n
+        self.safe_threshold = safe_threshold
+        self.min_shared = min_shared
+        postings = {}
+        for position, term in enumerate(self.vocab):
+            for gram in ngrams(term, n):
+                postings.setdefault(gram, []).append(position)
+        self.postings = {gram: np.array(positions, dtype=np.int64)
+                         for gram, positions in postings.items()}
+        self.scored = 0
+
+    def candidates(self, input_word, threshold):
+        '''Returns the sorted vocab positions worth scoring for input_word
+
+        Args:
+            input_word: the word to find candidates for
+            threshold: the match threshold the candidates will be held to
+
+        Returns:
+            numpy array of positions into vocab, in vocabulary order
+
+        '''
+        if threshold < self.safe_threshold:
+            return np.arange(len(self.vocab))
+        hits = [self.postings[gram] for gram in ngrams(input_word, self.n)
+                if gram in self.postings]
+        if len(hits) == 0:
+            return np.array([], dtype=np.int64)
+        positions, shared = np.unique(np.concatenate(hits), return_counts=True)
+        return positions[shared >= self.min_shared]
+
+    def extract(self, input_word, threshold, max_matches):
+        '''Matches single word to the candidate vocabulary terms
+
+        Same contract as VocabChecker.match_to_target: returns the list of
+        (match, score) tuples scoring > threshold, at most max_matches long,
+        sorted by score descending. Ties keep vocabulary order, like the full
+        scan does.
+
+        '''
+        candidates = self.vocab[self.candidates(input_word, threshold)]
+        self.scored += len(candidates)
+        matches = []
+        score_col = 1
+        for match in process.extract(input_word, candidates, limit=max_matches):
+            if match[score_col] > threshold:
+                matches.append(match)
+        return matches
+
+
+def wratio_upper_bound(length1, length2):
+    '''Returns the highest fuzz.WRatio two processed strings of these
+    lengths can score.
+
+    WRatio takes the best of ratio (at most 200 * shorter / total, by the
+    SequenceMatcher formula) and token ratios scaled down by how different
+    the lengths are: by .95 when the longer string is under 1.5 times the
+    shorter, .90 up to 8 times, .60 beyond that.
+
+    '''
+    shorter, longer = min(length1, length2), max(length1, length2)
+    if shorter == 0:
+        return 0
+    base = utils.intr(200.0 * shorter / (shorter + longer))
+    len_ratio = float(longer) / shorter
+    if len_ratio < 1.5:
+        return max(base, 95)
+    if len_ratio > 8:
+        return max(base, 60)
+    return max(base, 90)
+
+
+class LengthIndex:
+    '''Vocabulary grouped by processed length for exact top-k matching.
+
+    The length of two processed strings alone caps their WRatio score (see
+    wratio_upper_bound). extract visits the length groups best bound first
+    and stops as soon as a group's bound cannot pass the threshold or beat
+    the current max_matches-th best score, so short terms never get scored
+    against long descriptions when enough good matches are found. Groups
+    whose bound ties the current cut-off are still scored, since an earlier
+    vocabulary entry wins a tie; the matches and their order are exactly
+    those of process.extract over the whole vocabulary.
+
+    Attributes:
+        vocab: numpy array with the standard vocabulary
+        processed: list of the vocab terms processed like process.extract
+        groups: dict of processed length to numpy array of vocab positions
+        scored: the number of vocab terms scored by extract so far
+
+    '''
+
+    def __init__(self, vocab):
+        self.vocab = np.asarray(vocab)
+        self.processed = VocabScoring.process_vocab(self.vocab)
+        groups = {}
+        for position, term in enumerate(self.processed):
+            groups.setdefault(len(term), []).append(position)
+        self.groups = {length: np.array(positions, dtype=np.int64)
+                       for length, positions in groups.items()}
+        self.scored = 0
+
+    def extract(self, input_word, threshold, max_matches):
+        '''Matches single word to the vocabulary, skipping groups that
+        cannot make the top max_matches
+
+        Same contract as VocabChecker.match_to_target: returns the list of
+        (match, score) tuples scoring > threshold, at most max_matches long,
+        sorted by score descending, ties in vocabulary order.
+
+        '''
+        term = VocabScoring.process_term(input_word)
+        if len(term) == 0:
+            # every score is 0, nothing to prune
+            self.scored += len(self.vocab)
+            return [match for match in process.extract(input_word, self.vocab,
+                                                       limit=max_matches)
+                    if match[1] > threshold]
+        k = len(self.vocab) if max_matches is None else max_matches
+        if k <= 0:
+            return []
+        bounds = sorted(((wratio_upper_bound(len(term), length), length)
+                         for length in self.groups), reverse=True)
+        # min-heap of the best k as (score, -position)
+        best = []
+        for bound, length in bounds:
+            if bound <= threshold or (len(best) == k and bound < best[0][0]):
+                break
+            self.scored += len(self.groups[length])
+            for position in self.groups[length]:
+                score = fuzz.WRatio(term, self.processed[position], full_process=False)
+                if score <= threshold:
+                    continue
+                entry = (score, -int(position))
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+        best.sort(reverse=True)
+        return [(self.vocab[-position], score) for score, position in best]
+
+
+def normalize_key(text):
+    '''Returns the key text is looked up by in a KeyIndex.
+
+    The text is processed like process.extract processes it (lower case,
+    letters, numbers and underscores only), underscores split words too,
+    then the words are sorted and joined without separators, so case,
+    punctuation, separators and word order do not change the key.
+
+    Example:
+        normalize_key('ID_Customer') == normalize_key('customer id') == 'customerid'
+
+    '''
+    return ''.join(sorted(VocabScoring.process_term(text).replace('_', ' ').split()))
+
+
+class KeyIndex:
+    '''Hash lookup of exact and normalized-key hits before fuzzy matching.
+
+    After standardization many input terms already are a vocabulary term, or
+    equal one up to case, separators and word order. lookup resolves those
+    terms with a dict lookup, and returns None for the rest, which still
+    need fuzzy matching. Only the vocabulary terms sharing the term's key
+    are looked at:
+
+        exact hit       some of them process (like process.extract) to the
+                        same string as the term; those score 100 and the
+                        others are scored with WRatio, so the matches and
+                        the top match are the fuzzy ones within the group
+        normalized hit  none does; all of them score 100, so a reordered
+                        or run-together term scores 100 instead of about 95
+
+    Unlike fuzzy matching, a hit does not list the near matches outside its
+    key group; that is why the fast path is optional.
+
+    Attributes:
+        vocab: numpy array with the standard vocabulary
+        groups: dict of normalize_key to the list of (vocab term, processed
+            vocab term) with it, in vocabulary order
+        counts: dict of 'exact', 'normalized' and 'fuzzy' to the number of
+            terms looked up so far that took each path
+
+    '''
+
+    def __init__(self, vocab):
+        self.vocab = np.asarray(vocab)
+        self.groups = {}
+        for term, processed in zip(self.vocab, VocabScoring.process_vocab(self.vocab)):
+            key = normalize_key(term)
+            if key:
+                self.groups.setdefault(key, []).append((term, processed))
+        self.counts = {'exact': 0, 'normalized': 0, 'fuzzy': 0}
+
+    def lookup(self, input_word, threshold, max_matches):
+        '''Returns the list of (match, score) tuples for a key hit, sorted
+        by score descending (ties in vocab order), or None when input_word
+        has to be fuzzy matched'''
+        group = None
+        if isinstance(input_word, str) and threshold < 100:
+            group = self.groups.get(normalize_key(input_word))
+        if group is None:
+            self.counts['fuzzy'] += 1
+            return None
+        processed_word = VocabScoring.process_term(input_word)
+        if any(processed == processed_word for term, processed in group):
+            self.counts['exact'] += 1
+            matches = [(term, 100 if processed == processed_word else 
+                        fuzz.WRatio(processed_word, processed, full_process=False))
+                       for term, processed in group]
+            matches = sorted((match for match in matches if match[1] > threshold),
+                             key=lambda match: -match[1])
+        else:
+            self.counts['normalized'] += 1
+            matches = [(term, 100) for term, processed in group]
+        if max_matches is not None:
+            matches = matches[:max_matches]
+        return matches
+
+
+class EntityBlocks:
+    '''The standard vocabulary partitioned by entity.
+
+    Matching an input attribute only against the vocabulary attributes of
+    its own entity scores a small fraction of the vocabulary and avoids
+    'multiple matches' ties with same-named attributes of other entities.
+    An input entity name is resolved to a vocabulary entity by its
+    normalize_key, or else by the best fuzzy match scoring above
+    entity_threshold; names that resolve to no entity have no block.
+
+    Attributes:
+        entities: list of the vocab entity names, one per block
+        blocks: list of numpy arrays, the distinct attribute names of each
+            entity in vocabulary order
+        keys: dict of normalize_key of each entity name to its block
+        entity_threshold: the lowest fuzzy score for an entity match
+        resolved: dict of the input entity names seen so far to their
+            block (-1 for none)
+
+    '''
+
+    def __init__(self, entities, attributes, entity_threshold = ENTITY_THRESHOLD):
+        block_ids = {}
+        blocks = []
+        self.entities = []
+        self.keys = {}
+        for entity, attribute in zip(entities, attributes):
+            if not isinstance(entity, str):
+                continue
+            key = normalize_key(entity)
+            if key not in block_ids:
+                block_ids[key] = len(blocks)
+                blocks.append({})
+                self.entities.append(entity)
+            blocks[block_ids[key]][attribute] = None
+        self.keys = {key: block_id for key, block_id in block_ids.items() if key}
+        self.blocks = [np.array(list(block), dtype=object) for block in blocks]
+        self.entity_threshold = entity_threshold
+        self.resolved = {}
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def block_id(self, entity):
+        '''Returns the block of the vocab entity entity resolves to, or -1'''
+        if not isinstance(entity, str):
+            return -1
+        if entity not in self.resolved:
+            block_id = self.keys.get(normalize_key(entity), -1)
+            if block_id == -1 and self.entities:
+                match = process.extractOne(entity, self.entities,
+                                           score_cutoff=self.entity_threshold)
+                if match is not None:
+                    block_id = self.entities.index(match[0])
+            self.resolved[entity] = block_id
+        return self.resolved[entity]
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+'''Batch scoring engine for matching many terms to the standard vocabulary.
+
+Instead of calling fuzzywuzzy process.extract once per term, the vocabulary
+is processed once and the terms are scored in chunks into a NumPy score
+matrix (terms x vocab). Top match selection and the threshold filter are
+then done with array operations on each chunk.
+
+With rapidfuzz installed, a chunk is first scored in one vectorized
+rapidfuzz.process.cdist call, and only the cells that can pass the
+threshold are scored again with fuzz.WRatio. rapidfuzz's WRatio is not
+score for score the same as fuzzywuzzy's (fuzzywuzzy rounds each ratio and
+its partial_ratio only tries some alignments), but it is never more than
+PREFILTER_MARGIN below it, so no match is lost.
+
+The results are the same as VocabChecker.match_to_target: the same scorer
+(fuzz.WRatio) and string processing are used, and ties keep vocabulary
+order like process.extract does. extract_batch_arrays keeps them compact as
+a MatchResult (vocab positions and scores in flat arrays).
+
+  Typical usage example:
+
+  matches = extract_batch(terms, vocab, 70, 40)
+
+Created on Sat Oct 17 10:05:31 2026
+'''
+
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import fuzz, utils
+
+try:
+    from rapidfuzz import fuzz as rapid_fuzz, process as rapid_process
+except ImportError:
+    rapid_process = None
+
+
+BATCH_SIZE = 256
+# how far fuzzywuzzy's WRatio can be above rapidfuzz's (under 1 point)
+PREFILTER_MARGIN = 1
+
+
+def process_term(term):
+    '''Returns term processed the way process.extract processes a query'''
+    return utils.full_process(utils.full_process(term), force_ascii=True)
+
+def process_vocab(vocab):
+    '''Returns list of vocab terms processed the way process.extract does'''
+    return [utils.full_process(choice, force_ascii=True) for choice in vocab]
+
+def score_matrix(processed_terms, processed_vocab, threshold = None):
+    '''Scores every processed term against every processed vocab term
+
+    Args:
+        processed_terms: list of terms already run through process_term
+        processed_vocab: list of vocab terms already run through process_vocab
+        threshold: optional score the caller filters on (> threshold); 
+            with rapidfuzz installed only the cells rapidfuzz scores at 
+            least threshold - PREFILTER_MARGIN get their fuzz.WRatio score,
+            the rest are left 0
+
+    Returns:
+        numpy uint8 array with one row per term and one column per vocab term
+
+    '''
+    scores = np.zeros((len(processed_terms), len(processed_vocab)), dtype=np.uint8)
+    if threshold is not None and rapid_process is not None and scores.size:
+        cutoff = threshold - PREFILTER_MARGIN
+        prefilter = rapid_process.cdist(processed_terms, processed_vocab,
+                                        scorer=rapid_fuzz.WRatio, processor=None,
+                                        score_cutoff=max(cutoff, 0), dtype=np.float32)
+        for row, col in zip(*np.nonzero(prefilter >= cutoff)):
+            scores[row, col] = fuzz.WRatio(processed_terms[row], processed_vocab[col],
+                                           full_process=False)
+        return scores
+    for row, term in enumerate(processed_terms):
+        if len(term) == 0:
+            continue
+        scores[row] = [fuzz.WRatio(term, choice, full_process=False)
+                       for choice in processed_vocab]
+    return scores
+
+def top_matches(scores, max_matches):
+    '''Finds the highest scoring columns of each row of a score matrix
+
+    Uses argpartition so only max_matches columns per row get sorted. Ties
+    are broken by column position so the order is the same as
+    process.extract: score descending, then vocabulary order.
+
+    Args:
+        scores: numpy array with one row per term and one column per vocab term
+        max_matches: an integer representing the most matches to keep
+
+    Returns:
+        (positions, top_scores): two numpy arrays with one row per term and
+            min(max_matches, vocab size) columns, best match first
+
+    '''
+    rows, size = scores.shape
+    k = size if max_matches is None else min(max_matches, size)
+    # one key per cell: higher score first, then lower column position
+    keys = scores.astype(np.int64) * size + (size - 1 - np.arange(size))
+    if k < size:
+        positions = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    else:
+        positions = np.tile(np.arange(size), (rows, 1))
+    order = np.argsort(-np.take_along_axis(keys, positions, axis=1), axis=1)
+    positions = np.take_along_axis(positions, order, axis=1)
+    return positions, np.take_along_axis(scores, positions, axis=1)
+
+class MatchResult:
+    '''Matches for many terms kept as flat NumPy arrays.
+
+    A list of (match, score) tuples per term costs a few Python objects per
+    match. Here the matches of term i are positions[offsets[i]:offsets[i+1]]
+    into vocab (int32) with their scores (uint8), best first. rows maps each
+    input row to its term, so rows sharing a term share its matches.
+    Tuples are only made when a caller asks for them (matches, to_lists,
+    row_lists), for example when exporting.
+
+    Attributes:
+        vocab: numpy array with the standard vocabulary
+        offsets: int64 array, one longer than the number of terms
+        positions: int32 array of vocab positions
+        scores: uint8 array of scores
+        rows: int32 array with the term of each row (one row per term
+            unless given)
+
+    '''
+
+    def __init__(self, vocab, offsets, positions, scores, rows = None):
+        self.vocab = np.asarray(vocab)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.positions = np.asarray(positions, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.uint8)
+        if rows is None:
+            rows = np.arange(len(self.offsets) - 1)
+        self.rows = np.asarray(rows, dtype=np.int32)
+
+    @classmethod
+    def from_match_lists(cls, match_lists, vocab, rows = None):
+        '''Builds a MatchResult from lists of (match, score) tuples'''
+        vocab = np.asarray(vocab)
+        counts = [len(matches) for matches in match_lists]
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        matched = [match for matches in match_lists for match, score in matches]
+        # first position of each vocab term, the vocab may repeat terms
+        first_positions = pd.Series(np.arange(len(vocab)), index=vocab)
+        first_positions = first_positions[~first_positions.index.duplicated()]
+        positions = first_positions.reindex(matched).to_numpy() if matched else []
+        scores = [score for matches in match_lists for match, score in matches]
+        return cls(vocab, offsets, positions, scores, rows)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return (self.offsets.nbytes + self.positions.nbytes + self.scores.nbytes
+                + self.rows.nbytes)
+
+    def with_rows(self, rows):
+        '''Returns the same term matches with another row to term map'''
+        return MatchResult(self.vocab, self.offsets, self.positions, self.scores, rows)
+
+    def take(self, terms):
+        '''Returns a MatchResult with just the matches of terms, in order'''
+        terms = np.asarray(terms, dtype=np.int64)
+        counts = np.diff(self.offsets)[terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # position in the flat arrays of every match of the taken terms
+        flat = (np.repeat(self.offsets[terms] - offsets[:-1], counts)
+                + np.arange(offsets[-1]))
+        return MatchResult(self.vocab, offsets, self.positions[flat], self.scores[flat])
+
+    @classmethod
+    def concat(cls, results, rows = None):
+        '''Returns the terms of several MatchResults over the same vocab 
+        one after the other'''
+        offsets = [np.zeros(1, dtype=np.int64)]
+        total = 0
+        for result in results:
+            offsets.append(result.offsets[1:] + total)
+            total += result.offsets[-1]
+        return cls(results[0].vocab, np.concatenate(offsets),
+                   np.concatenate([result.positions for result in results]),
+                   np.concatenate([result.scores for result in results]), rows)
+
+    def matches(self, term):
+        '''Returns the (match, score) tuples of one term'''
+        start, end = self.offsets[term], self.offsets[term + 1]
+        return list(zip(self.vocab[self.positions[start:end]].tolist(),
+                        self.scores[start:end].tolist()))
+
+    def to_lists(self):
+        '''Returns a list of (match, score) tuples per term'''
+        return [self.matches(term) for term in range(len(self))]
+
+    def row_lists(self):
+        '''Returns a list of (match, score) tuples per row; rows with the
+        same term share one list'''
+        term_lists = self.to_lists()
+        return [term_lists[term] for term in self.rows.tolist()]
+
+    def top_match(self):
+        '''Returns the top match and score of every row, like 
+        VocabChecker.get_top_match: 'no matches' with score 0 when there
+        are none, 'multiple matches' when the two best scores tie
+
+        Returns:
+            (top_terms, top_scores): object array and int64 array, one 
+                entry per row
+
+        '''
+        counts = np.diff(self.offsets)
+        first = self.offsets[:-1]
+        has_match = counts > 0
+        top_terms = np.full(len(self), 'no matches', dtype=object)
+        top_scores = np.zeros(len(self), dtype=np.int64)
+        top_terms[has_match] = self.vocab[self.positions[first[has_match]]]
+        top_scores[has_match] = self.scores[first[has_match]]
+        has_second = counts > 1
+        tied = np.zeros(len(self), dtype=bool)
+        tied[has_second] = (self.scores[first[has_second] + 1] == 
+                            self.scores[first[has_second]])
+        top_terms[tied] = 'multiple matches'
+        return top_terms[self.rows], top_scores[self.rows]
+
+def extract_batch_arrays(terms, vocab, threshold, max_matches, batch_size = BATCH_SIZE):
+    '''Matches a list of terms to vocabulary - returns a MatchResult
+
+    Same matches as extract_batch, without making a tuple per match.
+
+    '''
+    vocab = np.asarray(vocab)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    if len(terms) == 0 or len(vocab) == 0 or max_matches == 0:
+        return MatchResult(vocab, offsets, [], [])
+    processed_vocab = process_vocab(vocab)
+    kept_positions = []
+    kept_scores = []
+    for start in range(0, len(terms), batch_size):
+        chunk = [process_term(term) for term in terms[start:start + batch_size]]
+        positions, top_scores = top_matches(score_matrix(chunk, processed_vocab,
+                                                         threshold), max_matches)
+        passed = top_scores > threshold
+        # rows are sorted best first, so what passes is a prefix of each row
+        kept_positions.append(positions[passed])
+        kept_scores.append(top_scores[passed])
+        np.cumsum(passed.sum(axis=1), out=offsets[start + 1:start + len(chunk) + 1])
+        offsets[start + 1:start + len(chunk) + 1] += offsets[start]
+    return MatchResult(vocab, offsets, np.concatenate(kept_positions),
+                       np.concatenate(kept_scores))
+
+def extract_batch(terms, vocab, threshold, max_matches, batch_size = BATCH_SIZE):
+    '''Matches a list of terms to vocabulary - returns list of match lists
+
+    Scores batch_size terms at a time so the score matrix stays bounded
+    (batch_size x vocab size bytes).
+
+    Args:
+        terms: the words to find matches for
+        vocab: a list with the standard vocabulary
+        threshold: an integer representing the lowest score for a match
+        max_matches: an integer representing the most matches to keep
+        batch_size: the number of terms scored per chunk
+
+    Returns:
+        A list with one entry per term, each a list of (match, score) tuples
+        scoring > threshold sorted by score descending, like match_to_target.
+
+    '''
+    return extract_batch_arrays(terms, vocab, threshold, max_matches, batch_size).to_lists()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+'''Local HTTP/JSON service that keeps a VocabMatcher warm in memory.
+
+Other tools can match terms without starting Python and reading the vocab
+again. Requests that arrive close together are coalesced by a MatchBatcher
+into one VocabMatcher.match_terms call: the batcher waits at most max_wait
+seconds after the first request, or until batch_size terms are queued, then
+matches the distinct terms of the batch once and sends each request its
+own results.
+
+Endpoints:
+    POST /match  body {"terms": [...], "standardize": true}
+                 returns {"matches": [[[term, score], ...], ...],
+                          "latency_ms": ...}
+    GET /stats   returns request and batch counts and the p50/p95/p99
+                 latency of recent requests
+
+  Typical usage example:
+
+  python VocabService.py --vocab MasterDDv2.xlsx --batch-size 256 --max-wait-ms 10
+
+Created on Sat Oct 17 15:02:11 2026
+'''
+
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import time
+import numpy as np
+import VocabChecker
+
+
+HOST = '127.0.0.1'
+PORT = 8765
+BATCH_SIZE = 256
+MAX_WAIT = 0.01
+# how many recent request latencies the percentiles are computed over
+LATENCY_WINDOW = 10000
+
+logger = logging.getLogger(__name__)
+
+
+class MatchBatcher:
+    '''Coalesces concurrent match requests into batched match_terms calls
+
+    Attributes:
+        matcher: the VocabChecker.VocabMatcher doing the matching
+        batch_size: the most terms matched in one call (a single larger
+            request is still matched in one call)
+        max_wait: seconds to wait for more requests after the first
+        latencies: the last LATENCY_WINDOW request latencies in seconds
+        request_count, batch_count, term_count: totals so far
+
+    '''
+
+    def __init__(self, matcher, batch_size = BATCH_SIZE, max_wait = MAX_WAIT):
+        self.matcher = matcher
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.request_count = 0
+        self.batch_count = 0
+        self.term_count = 0
+        self.queue = None
+        self.task = None
+
+    def start(self):
+        '''Starts the batching task on the running event loop'''
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    async def match(self, terms):
+        '''Queues standardized terms - returns their list of match lists'''
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((terms, future))
+        return await future
+
+    async def next_batch(self):
+        '''Waits for a request, then gathers more until the batch is full
+        or max_wait has passed since the first one'''
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.next_batch()
+            try:
+                # each distinct term is matched once for the whole batch
+                distinct = list(dict.fromkeys(term for terms, future in batch
+                                              for term in terms))
+                results = await loop.run_in_executor(
+                    None, lambda: self.matcher.match_terms(distinct, standardize=False))
+            except Exception as error:
+                for terms, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            matched_dict = dict(zip(distinct, results))
+            self.batch_count += 1
+            self.term_count += len(distinct)
+            for terms, future in batch:
+                if not future.done():
+                    future.set_result([matched_dict[term] for term in terms])
+
+    def record_latency(self, seconds):
+        self.request_count += 1
+        self.latencies.append(seconds)
+
+    def stats(self):
+        '''Returns counts and latency percentiles (milliseconds) as a dict'''
+        stats = {'requests': self.request_count, 'batches': self.batch_count,
+                 'distinct_terms_matched': self.term_count,
+                 'batch_size': self.batch_size, 'max_wait_ms': self.max_wait * 1000}
+        if self.latencies:
+            p50, p95, p99 = np.percentile(np.array(self.latencies) * 1000, [50, 95, 99])
+            stats['latency_ms'] = {'p50': p50, 'p95': p95, 'p99': p99}
+        return stats
+
+
+async def read_request(reader):
+    '''Reads one HTTP request - returns (method, path, body bytes)'''
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, version = request_line.decode('latin-1').split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, value = line.decode('latin-1').split(':', 1)
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return method, path, body
+
+def write_response(writer, status, payload):
+    body = json.dumps(payload).encode('utf-8')
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+               500: 'Internal Server Error'}
+    writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n'
+                  'Content-Length: %d\r\nConnection: close\r\n\r\n'
+                  % (status, reasons[status], len(body))).encode('latin-1') + body)
+
+async def handle_match(batcher, body):
+    '''Handles a POST /match body - returns (status, payload)'''
+    try:
+        request = json.loads(body or b'{}')
+        terms = request['terms']
+        if not isinstance(terms, list) or not all(isinstance(term, str) for term in terms):
+            raise ValueError('terms must be a list of strings')
+    except (ValueError, KeyError, TypeError) as error:
+        return 400, {'error': 'expected {"terms": [...]}: %s' % error}
+    if request.get('standardize', True):
+        terms = batcher.matcher.standardize(terms)
+    matches = await batcher.match(terms)
+    return 200, {'matches': matches}
+
+async def handle_connection(batcher, reader, writer):
+    '''Serves one request per connection'''
+    start = time.perf_counter()
+    try:
+        request = await read_request(reader)
+        if request is None:
+            return
+        method, path, body = request
+        if method == 'POST' and path == '/match':
+            status, payload = await handle_match(batcher, body)
+            if status == 200:
+                latency = time.perf_counter() - start
+                batcher.record_latency(latency)
+                payload['latency_ms'] = latency * 1000
+        elif method == 'GET' and path == '/stats':
+            status, payload = 200, batcher.stats()
+        else:
+            status, payload = 404, {'error': 'unknown endpoint %s %s' % (method, path)}
+    except Exception as error:
+        logger.exception('request failed')
+        status, payload = 500, {'error': str(error)}
+    write_response(writer, status, payload)
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+
+async def start_service(batcher, host = HOST, port = PORT):
+    '''Starts the batcher and the HTTP server - returns the asyncio Server'''
+    batcher.start()
+    return await asyncio.start_server(
+        lambda reader, writer: handle_connection(batcher, reader, writer), host, port)
+
+async def serve(batcher, host = HOST, port = PORT):
+    server = await start_service(batcher, host, port)
+    logger.info('serving vocab matches on %s:%d', host, port)
+    async with server:
+        await server.serve_forever()
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description='Local vocabulary matching service')
+    parser.add_argument('--vocab', default=VocabChecker.MASTER_VOCAB_FILE_NAME)
+    parser.add_argument('--translator', default=VocabChecker.TRANSLATOR_FILE_NAME)
+    parser.add_argument('--threshold', type=int, default=70)
+    parser.add_argument('--max-matches', type=int, default=40)
+    parser.add_argument('--index', choices=['ngram', 'length'])
+    parser.add_argument('--keys', action='store_true',
+                        help='resolve exact and normalized-key hits before fuzzy matching')
+    parser.add_argument('--workers', type=int,
+                        help='match each batch with a pool of this many processes')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT * 1000)
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+    # the matcher's worker pool lives as long as the service
+    with VocabChecker.VocabMatcher(args.vocab, args.translator, args.threshold,
+                                   args.max_matches, args.index, workers=args.workers,
+                                   use_keys=args.keys) as matcher:
+        batcher = MatchBatcher(matcher, args.batch_size, args.max_wait_ms / 1000)
+        asyncio.run(serve(batcher, args.host, args.port))
+
+if __name__ == '__main__':
+    main()
@@ -5,11 +5,26 @@ Then score the definitions for the entities, and find a single definition for
 each entity.
 Then extract unique entity names and definitions.
 
+The work is done in stages (see STAGES) by standardize_entities, which can 
+skip stages, cache stage outputs between runs, and reports each stage's time.
+
+  Typical usage example:
+
+  result_df, timings = standardize_entities('CombinedModels.xlsx', 
+                                            'MasterEntities.xlsx',
+                                            cache_dir='entity_cache')
+
 Created on Fri Mar  5 19:14:04 2021
 
 @author: klove
 """
+import hashlib
+import logging
+import os
+import time
 import pandas as pd
+import ExcelCache
+import ResultWriter
 import VocabChecker as vc
 import FilePrepUtils as fp
 
@@ -20,60 +35,180 @@ ENTITY_NAME_COL = 'Entity Name'
 ENTITY_DEFN_COL = 'Entity/Table Definition'
 ATTRIBUTE_COL = 'Attribute Name'
 ATT_DEFN_COL = 'Attribute/Column Definition'
+MODEL_COL = 'Model Name'
+COMMON_ENTITY_COL = 'Common Entity'
 #TRANSLATOR_FILE_NAME = WORKING_DIRECTORY +  'DD Transforms.xlsx'
 
 COMBINED_MODEL_FILE = 'CombinedModels.xlsx'
+MASTER_ENTITY_FILE = 'MasterEntities.xlsx'
+
+STAGES = ['load', 'filter', 'normalize', 'aggregate', 'dedupe', 'score', 'write']
+
+logger = logging.getLogger(__name__)
 
 
 def get_models(input_df, colname = ATTRIBUTE_COL):
-    '''For each attribute, get a list of models it is in
+    '''For each attribute, get a sorted tuple of models it is in
 
         Args:
             input_df: DataFrame to check
         
         Returns:  
             odf: pandas DataFrame with 1 row per attribute and 
-                list of models that attribute is in
+                tuple of models that attribute is in
     '''
-    odf = pd.DataFrame()
-    models = []
-    for search_name in input_df[colname].unique():
-        # find all the rows where this attribute appears
-        temp_df = input_df.loc[input_df[colname] == search_name]
-        models =list(temp_df['Model Name'].unique())
-        newrow = {colname: search_name, 'Models': models}
-        odf = odf.append(newrow, ignore_index=True)   
+    models = vc.models_by_name(input_df, colname)
+    odf = pd.DataFrame({colname: models.index, 'Models': models.values})
     return odf
 
-#preprocess_df(input_df, attr_col = ENTITY_NAME_COL, translate_file_name = TRANSLATOR_FILE_NAME):
-input_file_name = WORKING_DIRECTORY + COMBINED_MODEL_FILE
-input_df =  pd.read_excel(input_file_name)
-# only focus on entities
-processed_df = pd.DataFrame(input_df, columns=['Model Name', ENTITY_NAME_COL, ENTITY_DEFN_COL, 'Common Entity'])
-processed_df = processed_df.dropna(subset=[ENTITY_NAME_COL])
-# drop entities where we have marked as not interested
-# in other words, only keep rows where it's na
-processed_df = processed_df[processed_df['Common Entity'].isna()]
-# now standardize the dataset
-processed_df = vc.preprocess_df(processed_df, ENTITY_NAME_COL)
-
-merged_df = pd.merge(left=processed_df, 
-                     right=get_models(processed_df, ENTITY_NAME_COL), 
-                     left_on=ENTITY_NAME_COL, right_on=ENTITY_NAME_COL)
-
-# unique entity/attribute combos
-deduped_df = merged_df.drop_duplicates(subset=[ ENTITY_NAME_COL, ENTITY_DEFN_COL])
-
-# Score definitions for consistency across models
-#deduped_df['Definition Score1'] = vc.score_definitions(deduped_df, ENTITY_NAME_COL, ENTITY_DEFN_COL)
-#deduped_df['Instance Count'] = vc.attribute_count_in_df(deduped_df, ENTITY_NAME_COL)
-
-# see if trimming the definitions will help
-deduped_df[ENTITY_DEFN_COL] = deduped_df[ENTITY_DEFN_COL].fillna("")
-deduped_df[ENTITY_DEFN_COL] = fp.remove_lead_trail(deduped_df[ENTITY_DEFN_COL])
-deduped_df[ENTITY_DEFN_COL] = fp.remove_doublespace(deduped_df[ENTITY_DEFN_COL])
-deduped_df = deduped_df.drop_duplicates(subset=[ ENTITY_NAME_COL, ENTITY_DEFN_COL])
-deduped_df['Definition Score'] = vc.score_definitions(deduped_df, ENTITY_NAME_COL, ENTITY_DEFN_COL)
-deduped_df['Instance Count'] = vc.attribute_count_in_df(deduped_df, ENTITY_NAME_COL)
-
-deduped_df.to_excel(WORKING_DIRECTORY + "MasterEntities.xlsx")
+# =============================================================================
+#  stages: each takes the previous stage's DataFrame and returns the next one
+# =============================================================================
+
+def load_entities(input_file_name):
+    '''Reads the combined models through the columnar Excel cache'''
+    return ExcelCache.read_excel(input_file_name)
+
+def filter_entities(input_df):
+    '''Keeps the entity columns of rows with an entity name that are not 
+    marked in 'Common Entity' (only keep rows where it's na)'''
+    columns = [MODEL_COL, ENTITY_NAME_COL, ENTITY_DEFN_COL, COMMON_ENTITY_COL]
+    keep = input_df[ENTITY_NAME_COL].notna()
+    if COMMON_ENTITY_COL in input_df:
+        keep &= input_df[COMMON_ENTITY_COL].isna()
+    present = [col for col in columns if col in input_df]
+    return input_df.loc[keep, present].reindex(columns=columns, copy=False)
+
+def normalize_entities(input_df, translate_file_name = vc.TRANSLATOR_FILE_NAME):
+    return vc.preprocess_df(input_df, ENTITY_NAME_COL, translate_file_name)
+
+def aggregate_entities(input_df):
+    '''Adds the sorted tuple of models each entity is in'''
+    # a map on the aggregated Series keeps the row order and avoids a merge
+    models = vc.models_by_name(input_df, ENTITY_NAME_COL, MODEL_COL)
+    merged_df = input_df.assign(Models=input_df[ENTITY_NAME_COL].map(models))
+    return merged_df.reset_index(drop=True)
+
+def dedupe_entities(input_df):
+    '''Keeps the first row of each unique entity/trimmed definition combo
+    
+    Trimming before a single drop_duplicates keeps the same rows as 
+    dropping duplicates, trimming, and dropping duplicates again.
+    '''
+    definitions = input_df[ENTITY_DEFN_COL].fillna("")
+    trimmer = fp.Normalizer([str.strip, fp.doublespace_to_space])
+    trimmed_df = input_df.assign(**{ENTITY_DEFN_COL: trimmer.normalize(definitions)})
+    return trimmed_df.drop_duplicates(subset=[ ENTITY_NAME_COL, ENTITY_DEFN_COL])
+
+def score_entities(input_df):
+    '''Scores definitions for consistency across models'''
+    return input_df.assign(**{
+        'Definition Score': vc.score_definitions(input_df, ENTITY_NAME_COL, 
+                                                 ENTITY_DEFN_COL),
+        'Instance Count': vc.attribute_count_in_df(input_df, ENTITY_NAME_COL)})
+
+def write_entities(input_df, output_file_name):
+    ResultWriter.write_results(input_df, output_file_name)
+    return input_df
+
+# =============================================================================
+#  pipeline
+# =============================================================================
+
+def file_signature(file_name):
+    '''Returns text identifying a file's path and version (mtime and size)'''
+    stat = os.stat(file_name)
+    return '%s|%d|%d' % (os.path.abspath(file_name), stat.st_mtime_ns, stat.st_size)
+
+def stage_keys(input_file_name, translate_file_name, skip):
+    '''Returns a cache key per stage; a key changes when anything the 
+    stage's output depends on changes (input file, translator, skipped stages)'''
+    keys = {}
+    key = file_signature(input_file_name)
+    for stage in STAGES:
+        key += '|' + stage + ('-skipped' if stage in skip else '')
+        if stage == 'normalize' and stage not in skip:
+            translator = translate_file_name
+            if isinstance(translator, fp.Translator):
+                translator = translator.translator_fname
+            key += '|' + file_signature(translator)
+        keys[stage] = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return keys
+
+def standardize_entities(input_file_name, output_file_name = None,
+                         translate_file_name = vc.TRANSLATOR_FILE_NAME,
+                         skip = (), cache_dir = None):
+    '''Standardizes, dedupes and scores the entities of a combined model file
+    
+    Runs the stages in STAGES in order, passing each stage's DataFrame to
+    the next: load the Excel, filter to entity rows, normalize entity names,
+    aggregate the models per entity, dedupe entity/definition combos, score 
+    the definitions, and write the result to Excel.
+    
+    Args:
+        input_file_name: Excel with columns 'Model Name', 'Entity Name', 
+            'Entity/Table Definition' and optionally 'Common Entity';
+            or a DataFrame with those columns (skips load, no caching)
+        output_file_name: Excel to write the result to; None skips write
+        translate_file_name: translator file name or FilePrepUtils.Translator
+        skip: names of stages to skip; a skipped stage passes its input on
+        cache_dir: optional directory to keep each stage's output in. On the
+            next run the latest stage whose inputs have not changed is 
+            loaded from the cache and only the stages after it run.
+    
+    Returns:
+        (result_df, timings): the scored entities, and a list of
+            (stage, seconds, status) tuples where status is 'ran', 
+            'cached' or 'skipped'
+    '''
+    skip = set(skip)
+    if output_file_name is None:
+        skip.add('write')
+    data = None
+    keys = {}
+    if isinstance(input_file_name, pd.DataFrame):
+        data = input_file_name
+        skip.add('load')
+        cache_dir = None
+    elif cache_dir is not None:
+        keys = stage_keys(input_file_name, translate_file_name, skip)
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    # start after the latest stage with cached output
+    cached = None
+    for stage in STAGES[:-1]:
+        if keys and os.path.exists(os.path.join(cache_dir, keys[stage] + '.pkl')):
+            cached = stage
+    
+    stage_functions = {'load': lambda df: load_entities(input_file_name),
+                       'filter': filter_entities,
+                       'normalize': lambda df: normalize_entities(df, translate_file_name),
+                       'aggregate': aggregate_entities,
+                       'dedupe': dedupe_entities,
+                       'score': score_entities,
+                       'write': lambda df: write_entities(df, output_file_name)}
+    timings = []
+    for stage in STAGES:
+        start = time.perf_counter()
+        if cached is not None and STAGES.index(stage) <= STAGES.index(cached):
+            status = 'cached'
+            if stage == cached:
+                data = pd.read_pickle(os.path.join(cache_dir, keys[stage] + '.pkl'))
+        elif stage in skip:
+            status = 'skipped'
+        else:
+            status = 'ran'
+            data = stage_functions[stage](data)
+            if keys and stage != 'write':
+                data.to_pickle(os.path.join(cache_dir, keys[stage] + '.pkl'))
+        seconds = time.perf_counter() - start
+        logger.info('%s %s in %.3fs, %d rows', stage, status, seconds, 
+                    0 if data is None else len(data))
+        timings.append((stage, seconds, status))
+    return data, timings
+
+if __name__ == '__main__':
+    result_df, timings = standardize_entities(WORKING_DIRECTORY + COMBINED_MODEL_FILE, 
+                                              WORKING_DIRECTORY + MASTER_ENTITY_FILE)
+    for stage, seconds, status in timings:
+        print('%-10s %-8s %8.3fs' % (stage, status, seconds))
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+'''
+conftest.py
+
+Created on Sat Oct 17 20:12:31 2026
+'''
+import pytest
+import ExcelCache
+
+@pytest.fixture(autouse=True)
+def excel_cache_dir(tmp_path, monkeypatch):
+    '''Points the ExcelCache at a temporary directory for every test, so
+    test runs do not fill the user's cache'''
+    cache_dir = str(tmp_path / 'excel_cache')
+    monkeypatch.setattr(ExcelCache, 'CACHE_DIR', cache_dir)
+    return cache_dir
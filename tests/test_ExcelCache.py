@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+'''
+test_ExcelCache.py
+
+Created on Sat Oct 17 14:10:37 2026
+'''
+import os
+import tempfile
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import ExcelCache as ec
+
+WORKING_DIRECTORY = os.path.join(tempfile.gettempdir(), '')
+GITHUB_TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '')
+CACHE_DIR = WORKING_DIRECTORY + 'ExcelCacheTest'
+
+# =============================================================================
+# Tests
+# =============================================================================
+def test_read_excel():
+    '''cached reads return the same DataFrame as pd.read_excel
+
+    The first read fills the cache, the second reads the cached copy
+    '''
+    for file_name in ['DDScoreTest.xlsx', 'VocabMatcherTests.xlsx']:
+        expected_df = pd.read_excel(GITHUB_TEST_DIR + file_name)
+        assert(ec.read_excel(GITHUB_TEST_DIR + file_name, CACHE_DIR).equals(expected_df))
+        assert(ec.read_excel(GITHUB_TEST_DIR + file_name, CACHE_DIR).equals(expected_df))
+    assert(len(os.listdir(CACHE_DIR)) == 2)
+    shutil.rmtree(CACHE_DIR)
+
+def test_read_excel_changed():
+    '''a changed workbook is read again and replaces its old cached copy
+
+    Also covers a column mixing numbers and text, which is pickled
+    '''
+    file_name = WORKING_DIRECTORY + 'ExcelCacheChanged.xlsx'
+    pd.DataFrame({'Attribute Name': ['a', 'b']}).to_excel(file_name, index=False)
+    assert(list(ec.read_excel(file_name, CACHE_DIR)['Attribute Name']) == ['a', 'b'])
+    pd.DataFrame({'Attribute Name': ['a', 1, None]}).to_excel(file_name, index=False)
+    expected_df = pd.read_excel(file_name)
+    assert(ec.read_excel(file_name, CACHE_DIR).equals(expected_df))
+    assert(ec.read_excel(file_name, CACHE_DIR).equals(expected_df))
+    assert(len(os.listdir(CACHE_DIR)) == 1)
+    os.remove(file_name)
+    shutil.rmtree(CACHE_DIR)
+
+def test_warm_cache():
+    '''warm_cache caches every workbook in the directory
+
+    '''
+    warmed = ec.warm_cache(GITHUB_TEST_DIR, 'DDScore*.xlsx', CACHE_DIR)
+    assert([os.path.basename(file_name) for file_name in warmed] ==
+           ['DDScoreTest.xlsx', 'DDScoreTestExpected.xlsx'])
+    assert(len(os.listdir(CACHE_DIR)) == 2)
+    shutil.rmtree(CACHE_DIR)
+
+def test_default_cache_dir(excel_cache_dir):
+    '''the default cache directory is ExcelCache.CACHE_DIR when read, and
+    False skips the cache
+
+    '''
+    file_name = GITHUB_TEST_DIR + 'DDScoreTest.xlsx'
+    ec.read_excel(file_name, False)
+    assert(not os.path.exists(excel_cache_dir))
+    ec.read_excel(file_name)
+    assert(len(os.listdir(excel_cache_dir)) == 1)
+
+def test_stale_temp_files():
+    '''temporary files are unique per writer, and ones older than the new
+    copy (left by a crashed writer) are removed
+
+    '''
+    file_name = GITHUB_TEST_DIR + 'DDScoreTest.xlsx'
+    workbook_key, version_key = ec.cache_key(file_name, {})
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    stem = os.path.join(CACHE_DIR, workbook_key + '-' + version_key)
+    first, second = ec.temp_name(stem), ec.temp_name(stem)
+    assert(first != second and first.endswith('.tmp'))
+    os.utime(first, (0, 0))
+    os.remove(second)
+    ec.read_excel(file_name, CACHE_DIR)
+    assert([name.endswith('.feather') for name in os.listdir(CACHE_DIR)] == [True])
+    shutil.rmtree(CACHE_DIR)
+
+def test_concurrent_writers():
+    '''processes caching the same workbook at once all read it correctly'''
+    file_name = GITHUB_TEST_DIR + 'DDScoreTest.xlsx'
+    expected_df = pd.read_excel(file_name)
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(ec.read_excel, [file_name] * 8, [CACHE_DIR] * 8))
+    assert(all(result_df.equals(expected_df) for result_df in results))
+    assert(not [name for name in os.listdir(CACHE_DIR) if name.endswith('.tmp')])
+    shutil.rmtree(CACHE_DIR)
@@ -5,11 +5,15 @@ Created on Sat Feb 27 17:52:17 2021
 @author: klove
 """
 
+import os
+import tempfile
+import numpy as np
 import pandas as pd
+import openpyxl
 import FilePrepUtils as fp
 
-WORKING_DIRECTORY = 'C:\\Users\\klove\\Downloads\\'
-GITHUB_TEST_DIR = "C:\\Users\\klove\\OneDrive\\Documents\\GitHub\\DataScience\\tests\\"
+WORKING_DIRECTORY = os.path.join(tempfile.gettempdir(), '')
+GITHUB_TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '')
 
 def test_replace_at_beginning():
     test_df = pd.read_excel(GITHUB_TEST_DIR + 'VocabMatcherTests.xlsx')
@@ -53,3 +57,137 @@ def test_find_and_replace():
                                   GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx')
     expected = list(test_cases_df['Expected Attribute'])
     assert(results == expected ) 
+
+def test_compile_translations_stages():
+    '''translations that can change each other's matches go in later stages
+    
+    '''
+    stages = fp.compile_translations([('cust', 'Customer'), ('id', 'Identifier'),
+                                      ('nbr', 'Number'), ('cas number', 'CAS Number'),
+                                      ('no.', 'Number')])
+    assert([type(stage) for stage in stages] == [fp.WordStage, fp.WordStage, 
+                                                 fp.RegexStage])
+    assert(len(stages[0].rules) == 3)
+
+def test_translate_same_as_recode():
+    '''compiled translations give the same result as recode_old_new in order
+    
+    Covers whole attribute, beginning, middle, end, repeated words in the 
+    middle, chained translations and regex translations
+    '''
+    translations = [('dog', 'DOG'), ('alliance identifier', 'Agreement Packet Identifier'),
+                    ('cust', 'Customer'), ('customer id', 'Customer Identifier'),
+                    ('nbr', 'Number'), ('n.', 'Nbr'), ('id', 'ID')]
+    attributes = ['dog', 'Dog at begin', 'the dog', 'a dog dog dog b', 
+                  'alliance identifier', 'cust id', 'order nbr id', 'n1 x', 
+                  'doggy is not a dog', 'id', '', ' dog ', 'dog\n', 'Café id']
+    expected = attributes
+    for old_val, new_val in translations:
+        expected = fp.recode_old_new(expected, old_val, new_val)
+    results = fp.translate(attributes, fp.compile_translations(translations))
+    assert(results == expected)
+
+def test_translator():
+    '''unit tests for FilePrepUtils.Translator
+    
+    Translator gives the same results as find_and_replace, is only reloaded
+    when the translator file changes, and can be passed to find_and_replace
+    '''
+    test_df = pd.read_excel(GITHUB_TEST_DIR + 'VocabMatcherTests.xlsx')
+    test_cases_df = test_df[test_df['Model Name']=='TestFindReplace']
+    translator = fp.Translator(GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx')
+    expected = list(test_cases_df['Expected Attribute'])
+    assert(translator.translate(test_cases_df['Attribute Name']) == expected)
+    assert(fp.find_and_replace(test_cases_df['Attribute Name'], translator) == expected)
+    assert(translator.refresh() == False)
+
+def test_translator_reload():
+    '''Translator reloads when the translator file contents change
+    
+    '''
+    file_name = WORKING_DIRECTORY + 'TranslatorReloadTest.xlsx'
+    pd.DataFrame({'NonStandard': ['id'], 
+                  'Standard Logical': ['Identifier']}).to_excel(file_name)
+    translator = fp.Translator(file_name)
+    assert(translator.translate(['Cust id']) == ['Cust Identifier'])
+    pd.DataFrame({'NonStandard': ['id', 'cust'], 
+                  'Standard Logical': ['Identifier', 'Customer']}).to_excel(file_name)
+    assert(translator.translate(['Cust id']) == ['Customer Identifier'])
+    os.remove(file_name)
+
+def test_standardize_cosmetic():
+    '''standardize_cosmetic gives the same names as the chained functions
+    
+    '''
+    names = pd.Series(['test_underscore', 'two  spaces', ' leading trail ', 
+                       'test_underscore', 'Already Title', ''], index=range(10, 16))
+    expected = fp.standardize_case(fp.remove_lead_trail(fp.remove_doublespace(
+                    fp.remove_underscores(names))))
+    assert(fp.standardize_cosmetic(names) == expected)
+
+def test_normalizer():
+    '''unit tests for FilePrepUtils.Normalizer
+    
+    Test cases:
+        Series in, Series out with the same index
+        numpy string array in, numpy array out
+        missing values are left alone
+        added rules run in the same pass
+    '''
+    normalizer = fp.Normalizer()
+    result = normalizer.normalize(pd.Series(['cust_id', None], index=[7, 9]))
+    assert(list(result.index) == [7, 9])
+    assert(result[7] == 'Cust Id')
+    assert(result[9] is None)
+    result = normalizer.normalize(np.array(['cust_id', 'order  nbr']))
+    assert(list(result) == ['Cust Id', 'Order Nbr'])
+    normalizer = fp.Normalizer([fp.collapse_whitespace, fp.strip_punctuation])
+    normalizer.add_rule(str.upper)
+    assert(normalizer.normalize(['cust.  id', 'a\tb']) == ['CUST ID', 'A B'])
+
+def test_read_file_chunks():
+    '''read_file_chunks gives the same rows and labels as reading it whole
+    
+    Test cases:
+        xlsx read with openpyxl in chunks smaller than the file
+        csv read with read_csv chunks
+    '''
+    expected_df = pd.read_excel(GITHUB_TEST_DIR + 'VocabMatcherTests.xlsx')
+    chunks = list(fp.read_file_chunks(GITHUB_TEST_DIR + 'VocabMatcherTests.xlsx', 7))
+    assert(max(len(chunk) for chunk in chunks) == 7)
+    result_df = pd.concat(chunks)
+    assert(list(result_df.columns) == list(expected_df.columns))
+    assert(list(result_df.index) == list(expected_df.index))
+    assert(result_df.astype(str).equals(expected_df.astype(str)))
+    csv_file = WORKING_DIRECTORY + 'ReadChunksTest.csv'
+    expected_df.to_csv(csv_file, index=False)
+    result_df = pd.concat(fp.read_file_chunks(csv_file, 7))
+    assert(result_df.equals(pd.read_csv(csv_file)))
+    os.remove(csv_file)
+
+def test_read_excel_chunks_blank_rows():
+    '''read_excel_chunks names columns and keeps rows like pd.read_excel
+    
+    Test cases:
+        blank rows between data rows are kept (same row labels), trailing
+            blank rows are dropped
+        repeated header names get .1, .2 and blank header cells are Unnamed
+    '''
+    file_name = WORKING_DIRECTORY + 'ReadChunksBlankRows.xlsx'
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in [['Attribute Name', 'Attribute Name', 'Attribute Name.1', None, 'Entity Name'],
+                ['Cust Id', 'a', 'b', 1, 'Customer'], [None] * 5,
+                ['Order Nbr', None, None, None, 'Order'], [None] * 5, [None] * 5,
+                [None, None, 'c'], [None] * 5]:
+        sheet.append(row)
+    workbook.save(file_name)
+    expected_df = pd.read_excel(file_name)
+    assert(list(expected_df.columns) == ['Attribute Name', 'Attribute Name.2',
+                                         'Attribute Name.1', 'Unnamed: 3', 'Entity Name'])
+    for chunk_size in [1, 2, 4, 10]:
+        result_df = pd.concat(fp.read_file_chunks(file_name, chunk_size))
+        assert(list(result_df.columns) == list(expected_df.columns))
+        assert(list(result_df.index) == list(expected_df.index))
+        assert(result_df.astype(object).fillna('').equals(expected_df.astype(object).fillna('')))
+    os.remove(file_name)
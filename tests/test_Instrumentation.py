@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+'''
+test_Instrumentation.py
+
+Created on Sat Oct 17 17:30:04 2026
+'''
+import json
+import Instrumentation as ins
+
+# =============================================================================
+# Tests
+# =============================================================================
+def test_recorder():
+    '''unit tests for Instrumentation.Recorder
+
+    Test cases:
+        nested stages are named after their parent
+        repeated stages add up, counters add up
+        the report round trips through JSON
+    '''
+    recorder = ins.Recorder()
+    for repeat in range(2):
+        with recorder.stage('match'):
+            with recorder.stage('score'):
+                recorder.count('terms', 3)
+    assert(list(recorder.stages) == ['match', 'match.score'])
+    assert(recorder.stages['match']['calls'] == 2)
+    assert(recorder.stages['match']['wall'] >= recorder.stages['match.score']['wall'])
+    assert(recorder.counters == {'terms': 6})
+    assert(json.loads(recorder.to_json()) == recorder.report())
+
+def test_null_recorder():
+    '''NULL_RECORDER accepts the same calls and records nothing
+
+    '''
+    with ins.NULL_RECORDER.stage('match'):
+        ins.NULL_RECORDER.count('terms', 3)
+    assert(ins.NULL_RECORDER.report() == {'stages': {}, 'counters': {}})
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+'''
+test_ResultWriter.py
+
+Created on Sat Oct 17 18:40:51 2026
+'''
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import ResultWriter as rw
+import VocabScoring as vs
+
+WORKING_DIRECTORY = os.path.join(tempfile.gettempdir(), '')
+
+# =============================================================================
+# Utilities
+# =============================================================================
+def create_results_df():
+    return pd.DataFrame({'Attribute Name': ['Cust Id', None, 'Order Nbr'],
+                         'Matches': [[('Customer Identifier', 95), ('Customer', 90)], [],
+                                     [('Order Number', 100)]],
+                         'Models': [('m1', 'm2'), ('m3',), ()],
+                         'Top Match Score': [95, 0, 100],
+                         'Ratio': [1.5, np.nan, 2.0]}, index=[5, 6, 7])
+
+# =============================================================================
+# Tests
+# =============================================================================
+def test_flatten_value():
+    '''match lists, other lists and tuples are flattened, scalars kept
+
+    '''
+    assert(rw.flatten_value([('Customer Identifier', 95), ('Customer', 90)]) ==
+           'Customer Identifier (95); Customer (90)')
+    assert(rw.flatten_value(('m1', 'm2')) == 'm1; m2')
+    assert(rw.flatten_value([]) == '')
+    assert(rw.flatten_value(3) == 3)
+
+def test_write_results():
+    '''every backend writes the same flattened rows in batches
+
+    '''
+    input_df = create_results_df()
+    expected_df = rw.flatten_df(input_df)
+    readers = {'.xlsx': lambda name: pd.read_excel(name, index_col=0),
+               '.csv': lambda name: pd.read_csv(name, index_col=0),
+               '.parquet': pd.read_parquet}
+    for extension, reader in readers.items():
+        file_name = WORKING_DIRECTORY + 'ResultWriterTest' + extension
+        assert(rw.write_results(input_df, file_name, rows_per_batch=2) == 3)
+        result_df = reader(file_name)
+        assert(list(result_df.index) == [5, 6, 7])
+        assert(list(result_df.columns) == list(expected_df.columns))
+        for col in expected_df.columns:
+            assert(list(result_df[col].fillna('')) == list(expected_df[col].fillna('')))
+        os.remove(file_name)
+
+def test_write_matches():
+    '''a MatchResult written next to the rows gives the same text as its
+    match lists, for rows sharing a term too
+
+    '''
+    input_df = create_results_df()
+    result = vs.MatchResult.from_match_lists(list(input_df['Matches']),
+                                             ['Order Number', 'Customer', 
+                                              'Customer Identifier'])
+    assert(list(rw.flatten_matches(result)) == 
+           [rw.flatten_value(matches) for matches in input_df['Matches']])
+    shared = result.with_rows([2, 0, 2])
+    assert(list(rw.flatten_matches(shared)) == 
+           [rw.flatten_value(matches) for matches in shared.row_lists()])
+    file_name = WORKING_DIRECTORY + 'ResultWriterMatches.csv'
+    assert(rw.write_results(input_df.drop(columns=['Matches']), file_name, 
+                            rows_per_batch=2, matches=result, loc=1) == 3)
+    result_df = pd.read_csv(file_name, index_col=0)
+    assert(list(result_df.columns) == list(input_df.columns))
+    assert(list(result_df['Matches'].fillna('')) == 
+           list(rw.flatten_df(input_df)['Matches']))
+    os.remove(file_name)
+
+def test_excel_sheet_limit():
+    '''rows past the sheet limit continue on a new sheet with the header
+
+    '''
+    file_name = WORKING_DIRECTORY + 'ResultWriterSheets.xlsx'
+    with rw.ExcelWriter(file_name, max_rows=3) as writer:
+        writer.write(create_results_df())
+    sheets = pd.read_excel(file_name, sheet_name=None, index_col=0)
+    assert(list(sheets) == ['Sheet1', 'Sheet2'])
+    assert(list(sheets['Sheet2']['Attribute Name']) == ['Order Nbr'])
+    os.remove(file_name)
+
+def test_parquet_batch_dtypes():
+    '''a column blank (all NaN float) in the first batch and text later
+    still writes, and text in the first batch and blank later too
+
+    '''
+    file_name = WORKING_DIRECTORY + 'ResultWriterDtypes.parquet'
+    batches = [pd.DataFrame({'Attribute Name': ['a', 'b'],
+                             'Attribute/Column Definition': [np.nan, np.nan],
+                             'Top Match Score': [90, 95]}),
+               pd.DataFrame({'Attribute Name': [np.nan, np.nan],
+                             'Attribute/Column Definition': ['d', np.nan],
+                             'Top Match Score': [100, 0]}, index=[2, 3])]
+    assert(rw.write_batches(batches, file_name) == 4)
+    result_df = pd.read_parquet(file_name)
+    assert(list(result_df['Attribute Name'].fillna('')) == ['a', 'b', '', ''])
+    assert(list(result_df['Attribute/Column Definition'].fillna('')) == ['', '', 'd', ''])
+    assert(list(result_df['Top Match Score']) == [90, 95, 100, 0])
+    os.remove(file_name)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+'''
+test_VocabBatch.py
+
+Created on Sat Oct 17 19:24:08 2026
+'''
+import os
+import shutil
+import tempfile
+import pandas as pd
+import ResultWriter
+import VocabChecker as vc
+import VocabBatch as vb
+
+GITHUB_TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '')
+VOCAB_FILE = GITHUB_TEST_DIR + 'VocabMatcherIntTests.xlsx'
+TRANSLATOR_FILE = GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx'
+
+def test_output_names():
+    '''inputs with the same stem get different outputs'''
+    names = vb.output_names(['a/Model.xlsx', 'a/Model.csv', 'b/Other.xlsx'], 'out', '.csv')
+    assert(names == [os.path.join('out', 'Model_Matched.csv'),
+                     os.path.join('out', 'Model_Matched_2.csv'),
+                     os.path.join('out', 'Other_Matched.csv')])
+
+def test_run_batch():
+    '''unit tests for VocabBatch.run_batch
+    
+    Test cases:
+        every file in the directory is matched, lock files are skipped
+        outputs match run_vocab_match for the same file
+        a bad file is reported in the summary and error report, the rest
+            of the batch still runs
+        in process (workers=1) and worker processes give the same summary
+    '''
+    expected_df = vc.run_vocab_match(VOCAB_FILE, 90, 5, VOCAB_FILE, TRANSLATOR_FILE)
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_dir = os.path.join(work_dir, 'models')
+        os.makedirs(input_dir)
+        shutil.copy(VOCAB_FILE, os.path.join(input_dir, 'Model1.xlsx'))
+        pd.read_excel(VOCAB_FILE).to_csv(os.path.join(input_dir, 'Model2.csv'), index=False)
+        pd.DataFrame({'Column': [1, 2]}).to_excel(os.path.join(input_dir, 'Bad.xlsx'))
+        shutil.copy(VOCAB_FILE, os.path.join(input_dir, '~$Model1.xlsx'))
+
+        summaries = []
+        for workers in [1, 2]:
+            output_dir = os.path.join(work_dir, 'out%d' % workers)
+            summary_df = vb.run_batch(input_dir, output_dir, 90, 5, VOCAB_FILE,
+                                      TRANSLATOR_FILE, workers=workers, extension='.csv')
+            assert(list(summary_df['Input File'].map(os.path.basename)) ==
+                   ['Bad.xlsx', 'Model1.xlsx', 'Model2.csv'])
+            assert(list(summary_df['Status']) == ['error', 'ok', 'ok'])
+            assert(summary_df['Error'][0].startswith('KeyError'))
+            assert(list(summary_df['Rows']) == [0, len(expected_df), len(expected_df)])
+            for name in ['Model1_Matched.csv', 'Model2_Matched.csv']:
+                output_df = pd.read_csv(os.path.join(output_dir, name), index_col=0,
+                                        keep_default_na=False)
+                assert(list(output_df['Matches']) ==
+                       [ResultWriter.flatten_value(matches) for matches in expected_df['Matches']])
+            assert(os.path.exists(os.path.join(output_dir, vb.SUMMARY_FILE_NAME)))
+            errors_df = pd.read_csv(os.path.join(output_dir, vb.ERROR_FILE_NAME))
+            assert(list(errors_df['Input File'].map(os.path.basename)) == ['Bad.xlsx'])
+            summaries.append(summary_df.drop(columns=['Seconds']))
+        assert(summaries[0].drop(columns=['Output File'])
+               .equals(summaries[1].drop(columns=['Output File'])))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+'''
+test_VocabBenchmark.py
+
+Created on Sat Oct 17 16:40:18 2026
+'''
+import VocabBenchmark as vb
+
+# =============================================================================
+# Tests
+# =============================================================================
+def test_make_data():
+    '''the generators give the requested sizes and the expected columns
+
+    '''
+    vocab_df = vb.make_vocab(300)
+    assert(len(vocab_df) == 300 and vocab_df['Attribute Name'].is_unique)
+    dd_df = vb.make_data_dictionary(2000, vocab_df, distinct=100)
+    assert(len(dd_df) == 2000)
+    assert(list(dd_df.columns) == ['Model Name', 'Entity Name', 'Attribute Name',
+                                   'Attribute/Column Definition'])
+    assert(dd_df['Attribute Name'].nunique() <= 100)
+    assert(dd_df['Attribute/Column Definition'].isna().any())
+    assert(len(vb.make_translations(50)) == 50)
+    assert(vb.make_data_dictionary(2000, vocab_df, distinct=100).equals(dd_df))
+
+def test_run_suite_and_compare():
+    '''every stage is timed per size, and slower stages are regressions;
+    match_vocab is only compared at the same number of match rows
+
+    '''
+    results = vb.run_suite([100, 300], vocab_size=50, match_rows=200, repeat=1)
+    assert(list(results['results']) == ['100', '300'])
+    assert(list(results['results']['100']) == vb.STAGES)
+    assert(results['match_rows'] == {'100': 100, '300': 200})
+    assert(vb.compare(results, results) == [])
+    baseline = {'match_rows': {'300': 200},
+                'results': {'300': {'match_vocab': 0.0, 'unknown_stage': 1.0}}}
+    regressions = vb.compare(results, baseline, min_delta=0)
+    assert([(rows, stage) for rows, stage, before, seconds in regressions] ==
+           [('300', 'match_vocab')])
+    baseline['match_rows']['300'] = 20
+    assert(vb.compare(results, baseline, min_delta=0) == [])
@@ -7,11 +7,15 @@ Created on Sun Feb 14 22:05:05 2021
 @author: klove
 '''
 import VocabChecker as vc
+import Instrumentation as ins
+import ResultWriter as rw
 import pandas as pd
 import os
+import tempfile
+import pickle
 
-WORKING_DIRECTORY = 'C:\\Users\\klove\\Downloads\\'
-GITHUB_TEST_DIR = "C:\\Users\\klove\\OneDrive\\Documents\\GitHub\\DataScience\\tests\\"
+WORKING_DIRECTORY = os.path.join(tempfile.gettempdir(), '')
+GITHUB_TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '')
 REQUIRED_INPUT_COLUMNS = ['Model Name','Entity Name', 'Attribute Name', 
                           'Attribute/Column Definition']
 
@@ -96,7 +100,8 @@ def test_preprocess():
     '''
     test_df = pd.read_excel(GITHUB_TEST_DIR + 'VocabMatcherTests.xlsx')
     test_case_df = test_df[test_df['Model Name']=='TestPreprocess']
-    result_df = vc.preprocess_df(test_case_df)
+    result_df = vc.preprocess_df(test_case_df, 'Attribute Name', 
+                                 GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx')
     assert( list(result_df['Attribute Name']) ==list(test_case_df['Expected Attribute']))
 
 def test_run_vocab_match():
@@ -115,6 +120,175 @@ def test_run_vocab_match():
     results = list(result_df['Attribute Name'])
     expected = list(test_cases_df['Expected Attribute'])
     assert(results == expected ) 
+
+def test_run_vocab_match_recorder():
+    '''run_vocab_match times its stages and counts rows, terms and scoring
+    
+    '''
+    match_file_name = GITHUB_TEST_DIR + 'VocabMatcherIntTests.xlsx'
+    translator_file_name = GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx'
+    recorder = ins.Recorder()
+    result_df = vc.run_vocab_match(match_file_name, 90, 5, match_file_name, 
+                                   translator_file_name, recorder=recorder)
+    assert(list(recorder.stages) == ['load vocab', 'load translator', 'build index',
+                                     'read input', 'preprocess', 
+                                     'preprocess.standardize cosmetic',
+                                     'preprocess.translate', 'match', 'match.score',
+                                     'match.assemble', 'match.expand', 
+                                     'add definitions'])
+    counters = recorder.counters
+    assert(counters['result rows'] == len(result_df))
+    assert(counters['candidates scored'] == 
+           counters['distinct terms'] * counters['vocab terms'])
+    assert(counters.get('excel cache hits', 0) + counters.get('excel cache misses', 0) == 2)
+
+def test_run_vocab_match_keys():
+    '''the key fast path resolves exact and normalized hits without scoring
+
+    Test cases:
+        same top matches as fuzzy matching on the test file
+        the counters add up to the distinct terms, only fuzzy terms scored
+        same results with the batch engine and workers
+    '''
+    match_file_name = GITHUB_TEST_DIR + 'VocabMatcherIntTests.xlsx'
+    translator_file_name = GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx'
+    expected_df = vc.run_vocab_match(match_file_name, 90, 5, match_file_name, 
+                                     translator_file_name)
+    recorder = ins.Recorder()
+    result_df = vc.run_vocab_match(match_file_name, 90, 5, match_file_name, 
+                                   translator_file_name, recorder=recorder, use_keys=True)
+    for col in ['Top Match Attribute', 'Top Match Score']:
+        assert(result_df[col].equals(expected_df[col]))
+    counters = recorder.counters
+    assert(counters['exact key terms'] > 0 and counters['fuzzy terms'] > 0)
+    assert(counters['exact key terms'] + counters['normalized key terms'] + 
+           counters['fuzzy terms'] == counters['distinct terms'])
+    assert(counters['candidates scored'] == 
+           counters['fuzzy terms'] * counters['vocab terms'])
+    for batch_size, workers in [(64, None), (None, 2)]:
+        assert(vc.run_vocab_match(match_file_name, 90, 5, match_file_name, 
+                                  translator_file_name, batch_size=batch_size,
+                                  workers=workers, use_keys=True).equals(result_df))
+
+def test_run_vocab_match_blocks():
+    '''entity blocking matches each row in its entity's vocab first
+
+    Test cases:
+        rows whose entity has the same named attribute get it as top match
+            instead of 'multiple matches'
+        rows with nothing above threshold in the block fall back to the
+            whole vocab, which gives the unblocked result
+        same results with the batch engine, workers and iter_match
+    '''
+    match_file_name = GITHUB_TEST_DIR + 'VocabMatcherIntTests.xlsx'
+    translator_file_name = GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx'
+    expected_df = vc.run_vocab_match(match_file_name, 90, 5, match_file_name, 
+                                     translator_file_name)
+    recorder = ins.Recorder()
+    result_df = vc.run_vocab_match(match_file_name, 90, 5, match_file_name, 
+                                   translator_file_name, recorder=recorder, use_blocks=True)
+    vocab_df = pd.read_excel(match_file_name)
+    tied = expected_df['Top Match Attribute'] == 'multiple matches'
+    assert(tied.any())
+    assert(list(result_df.loc[tied, 'Top Match Attribute']) == 
+           list(vocab_df.loc[tied, 'Attribute Name']))
+    fallback = result_df['Top Match Attribute'] == 'no matches'
+    assert(result_df[fallback].equals(expected_df[fallback]))
+    counters = recorder.counters
+    assert(counters['blocked terms'] + counters['fallback terms'] == 
+           counters['distinct terms'])
+    assert(counters['fallback terms'] == fallback.sum())
+    for batch_size, workers in [(64, None), (None, 2)]:
+        assert(vc.run_vocab_match(match_file_name, 90, 5, match_file_name, 
+                                  translator_file_name, batch_size=batch_size,
+                                  workers=workers, use_blocks=True).equals(result_df))
+    matcher = vc.VocabMatcher(match_file_name, translator_file_name, 90, 5, 
+                              use_blocks=True)
+    batches = matcher.iter_match(vocab_df, rows_per_batch=3)
+    assert(pd.concat(batches).equals(result_df))
+
+def test_vocab_matcher():
+    '''unit tests for VocabChecker.VocabMatcher
+    
+    Test cases:
+        match_file gives the same results as run_vocab_match
+        match on a DataFrame, reusing the same matcher
+        iter_match batches add up to the same results
+        match_terms standardizes the terms like preprocess_df
+    '''
+    match_file_name = GITHUB_TEST_DIR + 'VocabMatcherIntTests.xlsx'
+    translator_file_name = GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx'
+    expected_df = vc.run_vocab_match(match_file_name, 90, 5, match_file_name, 
+                                     translator_file_name)
+    matcher = vc.VocabMatcher(match_file_name, translator_file_name, 90, 5)
+    assert(matcher.match_file(match_file_name).equals(expected_df))
+    assert(matcher.match(pd.read_excel(match_file_name)).equals(expected_df))
+    batches = matcher.iter_match(pd.read_excel(match_file_name), rows_per_batch=3)
+    assert(pd.concat(batches).equals(expected_df))
+    terms = list(pd.read_excel(match_file_name)['Attribute Name'].dropna())
+    assert(matcher.match_terms(terms) == list(expected_df['Matches']))
+    assert(list(matcher.vocab) == list(pd.unique(pd.read_excel(match_file_name)['Attribute Name'])))
+
+def test_match_vocab_progress():
+    '''match_vocab reports rows matched and stops when progress raises
+    
+    '''
+    terms = ['Customer Id', 'Order Nbr', 'Customer Id', 'Unit Of Measur'] * 60
+    to_match_df = pd.DataFrame({'Entity Name': 'Customer', 'Old Attribute Name': terms,
+                                'Attribute/Column Definition': '', 
+                                'Attribute Name': [term + str(i % 70) for i, term in enumerate(terms)]})
+    vocab = ['Customer Identifier', 'Order Number', 'Unit Of Measure']
+    reports = []
+    result_df = vc.match_vocab(to_match_df, vocab, 70, 5, 
+                               progress=lambda done, total: reports.append((done, total)))
+    assert(result_df.equals(vc.match_vocab(to_match_df, vocab, 70, 5)))
+    assert(reports[0] == (0, 240) and reports[-1] == (240, 240))
+    assert(len(reports) > 2 and reports == sorted(reports))
+    def cancel(done, total):
+        if done > 0:
+            raise KeyboardInterrupt()
+    try:
+        vc.match_vocab(to_match_df, vocab, 70, 5, batch_size=10, progress=cancel)
+        assert(False)
+    except KeyboardInterrupt:
+        pass
+
+def test_iter_vocab_matches():
+    '''iter_vocab_matches yields batches that add up to match_vocab
+    
+    Terms repeat across batches, so later batches reuse earlier matches
+    '''
+    terms = ['Customer Id', 'Order Nbr', 'Customer Id', 'Unit Of Measur', 'zzz'] * 5
+    to_match_df = pd.DataFrame({'Entity Name': 'Customer', 'Old Attribute Name': terms,
+                                'Attribute/Column Definition': '', 
+                                'Attribute Name': terms}, index=range(100, 125))
+    vocab = ['Customer Identifier', 'Order Number', 'Unit Of Measure']
+    batches = list(vc.iter_vocab_matches(to_match_df, vocab, 70, 5, rows_per_batch=4))
+    assert([len(batch) for batch in batches] == [4] * 6 + [1])
+    assert(pd.concat(batches).equals(vc.match_vocab(to_match_df, vocab, 70, 5)))
+
+def test_run_vocab_match_streaming():
+    '''run_vocab_match_streaming writes the same matches as run_vocab_match
+    
+    Uses a chunk size smaller than the match file so several chunks are
+    matched and appended to the output
+    '''
+    match_file_name = GITHUB_TEST_DIR + 'VocabMatcherIntTests.xlsx'
+    translator_file_name = GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx'
+    output_file_name = WORKING_DIRECTORY + 'StreamingMatchTest.csv'
+    expected_df = vc.run_vocab_match(match_file_name, 90, 5, match_file_name, 
+                                     translator_file_name)
+    row_count = vc.run_vocab_match_streaming(match_file_name, output_file_name, 90, 5, 
+                                             match_file_name, translator_file_name, 
+                                             chunk_size=3)
+    result_df = pd.read_csv(output_file_name, index_col=0)
+    assert(row_count == len(expected_df))
+    assert(list(result_df.columns) == list(expected_df.columns))
+    assert(list(result_df.index) == list(expected_df.index))
+    assert(list(result_df['Attribute Name']) == list(expected_df['Attribute Name']))
+    assert(list(result_df['Matches'].fillna('')) == 
+           [rw.flatten_value(matches) for matches in expected_df['Matches']])
+    os.remove(output_file_name)
     
 def test_get_top_match():
     '''unit tests for VocabChecker.get_top_match
@@ -213,6 +387,10 @@ def test_score_data_dictionary_out():
     assert((output_df['Definition Score'] <=2 ).all())
     assert(output_df['Instance Count'].notnull().all())
     assert((output_df['Instance Count'] > 0).all())
+    recorder = ins.Recorder()
+    assert(vc.score_data_dictionary("default.xlsx", recorder).equals(output_df))
+    assert(list(recorder.stages) == ['read input', 'score definitions', 'count instances'])
+    assert(recorder.counters['rows in'] == recorder.counters['rows out'] == len(output_df))
 
 def test_score_data_dictionary():
     '''unit tests for score_data_dictionary
@@ -259,3 +437,135 @@ def test_score_definitions():
     results = vc.score_definitions(input_df)    
     assert(type(results) == pd.Series)
     assert( list(results) == list(expected_df['Definition Score']))
+
+def test_dedupe_ratio():
+    '''unit tests for VocabChecker.dedupe_ratio
+    
+    Test cases:
+        every term distinct - ratio 1
+        each term repeated - rows per distinct term
+        no rows - ratio 1
+ 
+    '''
+    assert(vc.dedupe_ratio(5, 5) == 1.0)
+    assert(vc.dedupe_ratio(20, 4) == 5.0)
+    assert(vc.dedupe_ratio(0, 0) == 1.0)
+
+def test_match_vocab_dedupe():
+    '''unit tests for VocabChecker.match_vocab with repeated terms
+    
+    Each distinct term is scored once and every row with that term 
+    gets the same matches, in the original row order.
+ 
+    '''
+    vocab = ['Customer Identifier', 'Customer Name', 'Order Number']
+    terms = ['Customer Id', 'Order Nbr', 'Customer Id', 'Customer Id']
+    to_match_df = pd.DataFrame({'Entity Name': ['t1', 't1', 't2', 't3'],
+                                'Old Attribute Name': terms,
+                                'Attribute/Column Definition': '',
+                                'Attribute Name': terms})
+    result_df = vc.match_vocab(to_match_df, vocab, 70, 2)
+    expected = vc.match_to_target('Customer Id', vocab, 70, 2)
+    assert(list(result_df['Entity Name']) == ['t1', 't1', 't2', 't3'])
+    assert(result_df['Matches'][0] == expected)
+    assert(result_df['Matches'][2] == expected)
+    assert(result_df['Matches'][3] == expected)
+    assert(result_df['Matches'][1] == vc.match_to_target('Order Nbr', vocab, 70, 2))
+
+def test_match_terms_workers():
+    '''unit tests for VocabChecker.match_terms with a process pool
+    
+    Results from 2 workers come back in input order and are the same as
+    the serial loop and the batch engine.
+ 
+    '''
+    vocab = ['Customer Identifier', 'Customer Name', 'Order Number', 
+             'Order Date', 'Unit Of Measure']
+    terms = ['Customer Id', 'Order Nbr', 'Unit Of Measur', 'Cust Name', 
+             'Order Dt', 'zzz']
+    expected = vc.match_terms(terms, vocab, 70, 3)
+    assert(expected == [vc.match_to_target(term, vocab, 70, 3) for term in terms])
+    assert(vc.match_terms(terms, vocab, 70, 3, workers=2) == expected)
+    assert(vc.match_terms(terms, vocab, 70, 3, batch_size=2, workers=2) == expected)
+
+def test_vocab_matcher_pool():
+    '''a VocabMatcher with workers starts one pool and reuses it
+
+    Test cases:
+        the same pool matches every call, same matches as without workers
+        a pickled copy (sent to another process) has no pool
+        close, and leaving a with block, shut the pool down
+    '''
+    match_file_name = GITHUB_TEST_DIR + 'VocabMatcherIntTests.xlsx'
+    translator_file_name = GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx'
+    terms = list(pd.read_excel(match_file_name)['Attribute Name'].dropna())
+    expected = vc.VocabMatcher(match_file_name, translator_file_name, 90, 5).match_terms(terms)
+    with vc.VocabMatcher(match_file_name, translator_file_name, 90, 5, 
+                         workers=2) as matcher:
+        assert(matcher.pool is None)
+        assert(matcher.match_terms(terms) == expected)
+        pool = matcher.pool
+        assert(pool is not None)
+        assert(matcher.match_terms(terms[::-1]) == expected[::-1])
+        assert(matcher.match_file(match_file_name)['Matches'].tolist()
+               == vc.run_vocab_match(match_file_name, 90, 5, match_file_name,
+                                     translator_file_name)['Matches'].tolist())
+        assert(matcher.pool is pool)
+        assert(pickle.loads(pickle.dumps(matcher)).pool is None)
+    assert(matcher.pool is None)
+    matcher.close()
+
+def test_score_definition_pairs():
+    '''unit tests for VocabChecker.score_definition_pairs
+    
+    Scores attributes and entities in one call; the attribute scores are
+    the same as the expected Definition Score and as score_definitions for
+    the entity columns
+    '''
+    expected_df = pd.read_excel( GITHUB_TEST_DIR + "DDScoreTestExpected.xlsx")
+    input_df = pd.read_excel(GITHUB_TEST_DIR + "DDScoreTest.xlsx")
+    results = vc.score_definition_pairs(input_df, 
+                                        [('Attribute Name', 'Attribute/Column Definition'),
+                                         ('Entity Name', 'Entity/Table Definition')])
+    assert(list(results.columns) == ['Attribute Name Definition Score', 
+                                     'Entity Name Definition Score'])
+    assert(list(results['Attribute Name Definition Score']) == 
+           list(expected_df['Definition Score']))
+    entity_scores = vc.score_definitions(input_df, 'Entity Name', 'Entity/Table Definition')
+    assert(list(results['Entity Name Definition Score']) == list(entity_scores))
+
+def test_attribute_count_in_df():
+    '''unit tests for VocabChecker.attribute_count_in_df
+    
+    Test cases:
+        single column counts, same order as the input
+        composite key counts (entity, attribute)
+        distinct count of models per attribute
+        missing key counts 0
+    '''
+    input_df = pd.DataFrame({'Model Name': ['m1', 'm1', 'm2', 'm2', 'm2'],
+                             'Entity Name': ['e1', 'e2', 'e1', 'e1', 'e1'],
+                             'Attribute Name': ['a1', 'a1', 'a1', 'a2', None]})
+    counts = vc.attribute_count_in_df(input_df)
+    assert(counts.name == 'Instance Count')
+    assert(list(counts) == [3, 3, 3, 1, 0])
+    counts = vc.attribute_count_in_df(input_df, ['Entity Name', 'Attribute Name'])
+    assert(list(counts) == [2, 1, 2, 1, 0])
+    counts = vc.attribute_count_in_df(input_df, 'Attribute Name', 'Model Name')
+    assert(counts.name == 'Distinct Model Name Count')
+    assert(list(counts) == [2, 2, 2, 1, 0])
+
+def test_models_by_name():
+    '''unit tests for VocabChecker.models_by_name
+    
+    Test cases:
+        names in order of first appearance
+        models sorted and listed once per name
+        rows with a missing name are skipped
+    '''
+    input_df = pd.DataFrame({'Model Name': ['m2', 'm1', 'm2', 'm1', 'm3'],
+                             'Entity Name': ['e2', 'e1', 'e1', 'e1', None]},
+                            index=[9, 3, 5, 1, 0])
+    models = vc.models_by_name(input_df, 'Entity Name')
+    assert(list(models.index) == ['e2', 'e1'])
+    assert(list(models) == [('m2',), ('m1', 'm2')])
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+'''
+test_VocabIndex.py
+
+Created on Sat Oct 17 09:40:12 2026
+'''
+import VocabChecker as vc
+import VocabIndex as vi
+import numpy as np
+
+VOCAB = np.array(['Customer Identifier', 'Customer Name', 'Order Number',
+                  'Order Date', 'Product Description', 'Unit Of Measure',
+                  'CAS Number', 'Agreement Packet Identifier'])
+
+# =============================================================================
+# Tests
+# =============================================================================
+def test_ngrams():
+    '''unit tests for VocabIndex.ngrams
+
+    Test cases:
+        words are padded so short words still produce n-grams
+        case and punctuation are ignored like fuzzywuzzy does
+        word order does not change the n-grams
+        empty input has no n-grams
+
+    '''
+    expected = {' cu', 'cus', 'ust', 'st ', ' id', 'id '}
+    assert(vi.ngrams('Cust Id') == expected)
+    assert(vi.ngrams('cust-ID') == expected)
+    assert(vi.ngrams('Id Cust') == expected)
+    assert(vi.ngrams('') == set())
+
+def test_candidates():
+    '''unit tests for NgramIndex.candidates
+
+    Test cases:
+        only vocab terms sharing n-grams are candidates, in vocab order
+        a term sharing nothing with the vocab has no candidates
+        below the safe threshold the whole vocab is a candidate
+
+    '''
+    index = vi.NgramIndex(VOCAB)
+    candidates = list(VOCAB[index.candidates('Ordr Nmbr', 90)])
+    assert(candidates == ['Order Number', 'Order Date'])
+    assert(len(index.candidates('zzz', 90)) == 0)
+    assert(len(index.candidates('zzz', 85)) == len(VOCAB))
+
+def test_extract_matches_full_scan():
+    '''NgramIndex gives the same matches as the full scan at high thresholds
+
+    '''
+    index = vi.NgramIndex(VOCAB)
+    words = ['Customer Id', 'Cust Name', 'Order Nbr', 'Unit Of Measur',
+             'Identifier Customer', 'Cas Number', 'zzz']
+    for threshold in [80, 90, 95]:
+        for word in words:
+            expected = vc.match_to_target(word, VOCAB, threshold, 3)
+            assert(vc.match_to_target(word, VOCAB, threshold, 3, index) == expected)
+
+def test_extract_substring_matches_full_scan():
+    '''a substring in the middle of a word scores 90 with no shared n-grams,
+    so NgramIndex must not prune below threshold 90
+
+    '''
+    vocab = np.array(['Xaby Code', 'Cust Abc', 'Order Nbr', 'Ab'])
+    index = vi.NgramIndex(vocab)
+    assert(('Xaby Code', 90) in vc.match_to_target('ab', vocab, 80, 5))
+    for threshold in [70, 80, 85, 89, 90, 95]:
+        for word in ['ab', 'aby', 'rde', 'ust']:
+            assert(vc.match_to_target(word, vocab, threshold, 5, index) ==
+                   vc.match_to_target(word, vocab, threshold, 5))
+
+def test_wratio_upper_bound():
+    '''the length bound is never below the real WRatio score
+
+    '''
+    words = ['id', 'Customer Id', 'Customer Identifier', 'Agreement Packet Identifier',
+             'Customer Identifier Customer Identifier Customer Identifier']
+    for first in words:
+        for second in words:
+            p1, p2 = vi.VocabScoring.process_term(first), vi.VocabScoring.process_term(second)
+            assert(vi.fuzz.WRatio(p1, p2, full_process=False) <= 
+                   vi.wratio_upper_bound(len(p1), len(p2)))
+    assert(vi.wratio_upper_bound(2, 20) == 60)
+    assert(vi.wratio_upper_bound(0, 5) == 0)
+
+def test_length_index_matches_full_scan():
+    '''LengthIndex gives the same matches as the full scan at any threshold
+
+    Includes ties (same score, kept in vocab order) and an empty term
+    '''
+    vocab = np.append(VOCAB, ['Customer Id', 'Id Customer', 'Id', ''])
+    index = vc.build_index(vocab, 'length')
+    assert(isinstance(index, vi.LengthIndex))
+    words = ['Customer Id', 'Cust Name', 'Order Nbr', 'Unit Of Measur', 'Id',
+             'Identifier Customer', 'Cas Number', 'zzz', '']
+    for threshold in [0, 50, 70, 90, 95]:
+        for max_matches in [1, 3, 40]:
+            for word in words:
+                expected = vc.match_to_target(word, vocab, threshold, max_matches)
+                assert(vc.match_to_target(word, vocab, threshold, max_matches, index) 
+                       == expected)
+
+def test_normalize_key():
+    '''case, separators and word order do not change the key'''
+    assert(vi.normalize_key('ID_Customer') == 'customerid')
+    assert(vi.normalize_key('customer id') == 'customerid')
+    assert(vi.normalize_key('CustomerId') == 'customerid')
+    assert(vi.normalize_key('--') == '')
+
+def test_key_index():
+    '''unit tests for VocabIndex.KeyIndex
+    
+    Test cases:
+        exact hit: the top match is the term itself, a reordered sibling
+            gets its real (lower) score, like fuzzy matching
+        exact up to case counts as exact
+        normalized hit: every vocab term of the key scores 100
+        miss, empty key and threshold 100 go to fuzzy matching
+        max_matches limits a hit, counts track each path
+    '''
+    vocab = np.array(['Customer Id', 'Id Customer', 'Order Number'])
+    keys = vi.KeyIndex(vocab)
+    expected = vc.match_to_target('Customer Id', vocab, 90, 40)
+    assert(expected == [('Customer Id', 100), ('Id Customer', 95)])
+    assert(keys.lookup('Customer Id', 90, 40) == expected)
+    assert(vc.get_top_match(keys.lookup('Customer Id', 90, 40)) == ('Customer Id', 100))
+    assert(keys.lookup('customer id', 90, 40) == expected)
+    assert(keys.lookup('Customer Id', 95, 40) == [('Customer Id', 100)])
+    assert(keys.lookup('Customer Id', 90, 1) == [('Customer Id', 100)])
+    assert(keys.lookup('Id_Customer', 90, 40) == 
+           [('Customer Id', 100), ('Id Customer', 100)])
+    assert(keys.lookup('Cust Name', 70, 40) is None)
+    assert(keys.lookup('--', 70, 40) is None)
+    assert(keys.lookup('Customer Id', 100, 40) is None)
+    assert(keys.counts == {'exact': 5, 'normalized': 1, 'fuzzy': 3})
+
+def test_entity_blocks():
+    '''unit tests for VocabIndex.EntityBlocks
+    
+    Test cases:
+        one block per entity key, distinct attributes in vocab order
+        input entities resolve by key, then by fuzzy match, else -1
+    '''
+    blocks = vi.EntityBlocks(['Customer', 'Order', 'customer', 'Order', np.nan],
+                             ['Customer Name', 'Order Date', 'Customer Id', 'Order Date',
+                              'Orphan'])
+    assert(blocks.entities == ['Customer', 'Order'])
+    assert([list(block) for block in blocks.blocks] == 
+           [['Customer Name', 'Customer Id'], ['Order Date']])
+    assert(blocks.block_id('CUSTOMER') == 0)
+    assert(blocks.block_id('Orders') == 1)
+    assert(blocks.block_id('Product') == -1)
+    assert(blocks.block_id(np.nan) == -1)
+    assert(blocks.resolved == {'CUSTOMER': 0, 'Orders': 1, 'Product': -1})
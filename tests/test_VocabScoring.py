@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+'''
+test_VocabScoring.py
+
+Created on Sat Oct 17 10:31:08 2026
+'''
+import os
+import VocabChecker as vc
+import VocabScoring as vs
+import numpy as np
+import pandas as pd
+
+GITHUB_TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '')
+
+VOCAB = np.array(['Customer Identifier', 'Customer Name', 'Order Number',
+                  'Order Date', 'Product Description', 'Unit Of Measure',
+                  'CAS Number', 'Agreement Packet Identifier'])
+TERMS = ['Customer Id', 'Cust Name', 'Order Nbr', 'Unit Of Measur',
+         'Identifier Customer', 'Cas Number', 'Number', '', 'zzz']
+
+# =============================================================================
+# Tests
+# =============================================================================
+def test_top_matches():
+    '''unit tests for VocabScoring.top_matches
+
+    Test cases:
+        highest score first
+        ties keep column order, also across the argpartition boundary
+        max_matches larger than the vocab returns every column
+
+    '''
+    scores = np.array([[10, 90, 50, 90, 90],
+                       [0, 0, 0, 0, 100]], dtype=np.uint8)
+    positions, top_scores = vs.top_matches(scores, 2)
+    assert(positions.tolist() == [[1, 3], [4, 0]])
+    assert(top_scores.tolist() == [[90, 90], [100, 0]])
+    positions, top_scores = vs.top_matches(scores, 10)
+    assert(positions.tolist() == [[1, 3, 4, 2, 0], [4, 0, 1, 2, 3]])
+
+def test_score_matrix_threshold():
+    '''with a threshold every score above it is the fuzz.WRatio score
+
+    Scores the text of the test workbooks against itself; the rapidfuzz
+    prefilter (when installed) must not drop or change any of them.
+
+    '''
+    texts = set()
+    for file_name in ['VocabMatcherIntTests.xlsx', 'VocabMatcherTests.xlsx',
+                      'DDScoreTest.xlsx']:
+        input_df = pd.read_excel(GITHUB_TEST_DIR + file_name)
+        for col in input_df.columns[input_df.dtypes == object]:
+            texts.update(str(value) for value in input_df[col].dropna())
+    texts = sorted(texts) + TERMS
+    processed_terms = [vs.process_term(text) for text in texts]
+    processed_vocab = vs.process_vocab(texts)
+    expected = vs.score_matrix(processed_terms, processed_vocab)
+    for threshold in [0, 50, 70, 90]:
+        scores = vs.score_matrix(processed_terms, processed_vocab, threshold)
+        assert(np.array_equal(np.where(scores > threshold, scores, 0),
+                              np.where(expected > threshold, expected, 0)))
+
+def test_extract_batch():
+    '''extract_batch gives the same matches as match_to_target
+
+    Uses a batch size smaller than the number of terms so several chunks
+    are scored.
+
+    '''
+    for threshold, max_matches in [(0, 3), (70, 40), (90, 2)]:
+        expected = [vc.match_to_target(term, VOCAB, threshold, max_matches)
+                    for term in TERMS]
+        results = vs.extract_batch(TERMS, VOCAB, threshold, max_matches, 4)
+        assert(results == expected)
+
+def test_match_vocab_batch():
+    '''match_vocab output is the same with and without batch_size
+
+    '''
+    to_match_df = pd.DataFrame({'Entity Name': ['Customer'] * len(TERMS),
+                                'Old Attribute Name': TERMS,
+                                'Attribute/Column Definition': '',
+                                'Attribute Name': TERMS})
+    expected_df = vc.match_vocab(to_match_df, VOCAB, 70, 5)
+    result_df = vc.match_vocab(to_match_df, VOCAB, 70, 5, batch_size=4)
+    assert(result_df.equals(expected_df))
+
+def test_match_result():
+    '''unit tests for VocabScoring.MatchResult
+
+    Test cases:
+        from_match_lists and extract_batch_arrays hold the same matches
+        top_match gives get_top_match for every row, ties included
+        rows sharing a term share its matches
+        the arrays use the compact dtypes
+        take and concat pick and join terms without making tuples
+    '''
+    vocab = np.append(VOCAB, ['Customer Id', 'Customer Id'])
+    expected = [vc.match_to_target(term, vocab, 50, 5) for term in TERMS]
+    result = vs.MatchResult.from_match_lists(expected, vocab)
+    assert(result.to_lists() == expected)
+    assert(vs.extract_batch_arrays(TERMS, vocab, 50, 5, 4).to_lists() == expected)
+    assert(result.positions.dtype == np.int32 and result.scores.dtype == np.uint8)
+    rows = [0, 0, 6, 3, 8, 7]
+    top_terms, top_scores = result.with_rows(rows).top_match()
+    assert(list(zip(top_terms, top_scores)) ==
+           [vc.get_top_match(expected[row]) for row in rows])
+    row_lists = result.with_rows(rows).row_lists()
+    assert(row_lists == [expected[row] for row in rows])
+    assert(row_lists[0] is row_lists[1])
+    taken = result.take([3, 0, 3])
+    assert(taken.to_lists() == [expected[3], expected[0], expected[3]])
+    joined = vs.MatchResult.concat([taken, result.take([])], [2, 0])
+    assert(joined.to_lists() == taken.to_lists())
+    assert(joined.row_lists() == [expected[3], expected[3]])
+
+def test_match_vocab_compact():
+    '''match_vocab_compact has the match_vocab columns except Matches
+
+    '''
+    to_match_df = pd.DataFrame({'Entity Name': ['Customer'] * len(TERMS),
+                                'Old Attribute Name': TERMS,
+                                'Attribute/Column Definition': '',
+                                'Attribute Name': TERMS})
+    expected_df = vc.match_vocab(to_match_df, VOCAB, 70, 5)
+    output_df, result = vc.match_vocab_compact(to_match_df, VOCAB, 70, 5, batch_size=4)
+    assert(output_df.equals(expected_df.drop(columns=['Matches'])))
+    assert(result.row_lists() == list(expected_df['Matches']))
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+'''
+test_VocabService.py
+
+Created on Sat Oct 17 15:20:46 2026
+'''
+import os
+import asyncio
+import json
+import VocabChecker as vc
+import VocabService as vsvc
+
+GITHUB_TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '')
+VOCAB_FILE = GITHUB_TEST_DIR + 'VocabMatcherIntTests.xlsx'
+TRANSLATOR_FILE = GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx'
+
+# =============================================================================
+# Utilities
+# =============================================================================
+async def request(port, method, path, payload = None):
+    '''Sends one HTTP request - returns (status, decoded JSON)'''
+    reader, writer = await asyncio.open_connection(vsvc.HOST, port)
+    body = b'' if payload is None else json.dumps(payload).encode('utf-8')
+    writer.write(('%s %s HTTP/1.1\r\nContent-Length: %d\r\n\r\n'
+                  % (method, path, len(body))).encode('latin-1') + body)
+    response = await reader.read()
+    writer.close()
+    head, body = response.split(b'\r\n\r\n', 1)
+    return int(head.split()[1]), json.loads(body)
+
+async def run_requests(batcher, term_lists):
+    server = await vsvc.start_service(batcher, port=0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        responses = await asyncio.gather(*[request(port, 'POST', '/match', {'terms': terms})
+                                           for terms in term_lists])
+        bad_request = await request(port, 'POST', '/match', {'words': []})
+        stats = await request(port, 'GET', '/stats')
+    finally:
+        server.close()
+        await server.wait_closed()
+        await batcher.stop()
+    return responses, bad_request, stats
+
+# =============================================================================
+# Tests
+# =============================================================================
+def test_service():
+    '''concurrent requests are coalesced and each gets its own matches
+
+    Test cases:
+        matches are the same as VocabMatcher.match_terms
+        requests sent together are matched in fewer batches
+        missing terms is a 400, stats report latency percentiles
+    '''
+    matcher = vc.VocabMatcher(VOCAB_FILE, TRANSLATOR_FILE, 90, 5)
+    term_lists = [['cust_id', 'Order Nbr'], ['unit of measure'], ['cust_id'], []]
+    batcher = vsvc.MatchBatcher(matcher, batch_size=100, max_wait=0.5)
+    responses, bad_request, stats = asyncio.run(run_requests(batcher, term_lists))
+    for terms, (status, payload) in zip(term_lists, responses):
+        assert(status == 200)
+        expected = [[list(match) for match in matches]
+                    for matches in matcher.match_terms(terms)]
+        assert(payload['matches'] == expected)
+    assert(bad_request[0] == 400)
+    status, payload = stats
+    assert(payload['requests'] == len(term_lists))
+    assert(payload['batches'] < len(term_lists))
+    assert(set(payload['latency_ms']) == {'p50', 'p95', 'p99'})
+
+async def run_bad_then_good(batcher):
+    server = await vsvc.start_service(batcher, port=0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        bad_request = await request(port, 'POST', '/match', 
+                                    {'terms': [['x']], 'standardize': False})
+        try:
+            await asyncio.wait_for(batcher.match([['x']]), 10)
+            failed = None
+        except TypeError as error:
+            failed = error
+        good_request = await asyncio.wait_for(
+            request(port, 'POST', '/match', {'terms': ['Order Nbr']}), 10)
+    finally:
+        server.close()
+        await server.wait_closed()
+        await batcher.stop()
+    return bad_request, failed, good_request
+
+def test_service_bad_terms():
+    '''terms that are not strings are a 400 and do not stop the batcher
+
+    Test cases:
+        a list term is rejected before it is queued
+        a batch that fails passes the error to its requests only, and the
+            next request is still matched
+    '''
+    matcher = vc.VocabMatcher(VOCAB_FILE, TRANSLATOR_FILE, 90, 5)
+    batcher = vsvc.MatchBatcher(matcher, batch_size=100, max_wait=0.01)
+    bad_request, failed, good_request = asyncio.run(run_bad_then_good(batcher))
+    assert(bad_request[0] == 400)
+    assert(isinstance(failed, TypeError))
+    assert(good_request[0] == 200)
+    assert(good_request[1]['matches'] == [[list(match) for match in matches]
+                                          for matches in matcher.match_terms(['Order Nbr'])])
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+'''
+test_standardizeEntityNames.py
+
+Created on Sat Oct 17 13:02:45 2026
+'''
+import os
+import tempfile
+import shutil
+import pandas as pd
+import standardizeEntityNames as se
+
+WORKING_DIRECTORY = os.path.join(tempfile.gettempdir(), '')
+GITHUB_TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '')
+TRANSLATOR_FILE = GITHUB_TEST_DIR + 'File_Util_TransformDD_Test.xlsx'
+
+# =============================================================================
+# Utilities
+# =============================================================================
+def create_models_df():
+    return pd.DataFrame({'Model Name': ['m1', 'm2', 'm2', 'm3', 'm1'],
+                         'Entity Name': ['uom', 'UOM', None, 'dog_house', 'uom'],
+                         'Entity/Table Definition': ['unit', ' unit ', 'x',
+                                                     'a  house', 'other'],
+                         'Common Entity': [None, None, None, None, 'no'],
+                         'Other Column': [1, 2, 3, 4, 5]})
+
+# =============================================================================
+# Tests
+# =============================================================================
+def test_get_models():
+    '''unit tests for standardizeEntityNames.get_models
+
+    '''
+    odf = se.get_models(create_models_df(), 'Entity Name')
+    assert(list(odf['Entity Name']) == ['uom', 'UOM', 'dog_house'])
+    assert(list(odf['Models']) == [('m1',), ('m2',), ('m3',)])
+
+def test_standardize_entities():
+    '''unit tests for standardizeEntityNames.standardize_entities
+
+    Test cases:
+        rows without entity name or marked as common entity are dropped
+        names are standardized and definitions trimmed before deduping
+        models are aggregated per standardized entity
+        every stage reports its timing
+    '''
+    result_df, timings = se.standardize_entities(create_models_df(),
+                                                 translate_file_name=TRANSLATOR_FILE)
+    assert(list(result_df['Entity Name']) == ['Unit of Measure', 'DOG House'])
+    assert(list(result_df['Entity/Table Definition']) == ['unit', 'a house'])
+    assert(list(result_df['Models']) == [('m1', 'm2'), ('m3',)])
+    assert(list(result_df['Definition Score']) == [2, 2])
+    assert(list(result_df['Instance Count']) == [1, 1])
+    assert([stage for stage, seconds, status in timings] == se.STAGES)
+    assert([status for stage, seconds, status in timings] ==
+           ['skipped', 'ran', 'ran', 'ran', 'ran', 'ran', 'skipped'])
+
+def test_standardize_entities_keeps_input():
+    '''the caller's DataFrame is not changed, even when the stages before
+    dedupe are skipped
+
+    '''
+    input_df = create_models_df().dropna(subset=['Entity Name'])
+    expected_df = input_df.copy()
+    result_df, timings = se.standardize_entities(input_df, skip=['filter', 'normalize',
+                                                                 'aggregate'])
+    assert(input_df.equals(expected_df))
+    assert(list(result_df['Entity/Table Definition']) == ['unit', 'unit', 'a house',
+                                                          'other'])
+
+def test_standardize_entities_cache():
+    '''standardize_entities reruns only the stages whose inputs changed
+
+    '''
+    input_file = WORKING_DIRECTORY + 'EntityCacheTest.xlsx'
+    cache_dir = WORKING_DIRECTORY + 'EntityCacheTest'
+    create_models_df().to_excel(input_file, index=False)
+    first_df, timings = se.standardize_entities(input_file, None, TRANSLATOR_FILE,
+                                                cache_dir=cache_dir)
+    second_df, timings = se.standardize_entities(input_file, None, TRANSLATOR_FILE,
+                                                 cache_dir=cache_dir)
+    assert(second_df.equals(first_df))
+    assert([status for stage, seconds, status in timings] ==
+           ['cached'] * 6 + ['skipped'])
+    third_df, timings = se.standardize_entities(input_file, None, TRANSLATOR_FILE,
+                                                skip=['score'], cache_dir=cache_dir)
+    assert([status for stage, seconds, status in timings] ==
+           ['cached'] * 5 + ['skipped', 'skipped'])
+    assert('Definition Score' not in third_df)
+    os.remove(input_file)
+    shutil.rmtree(cache_dir)